@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#       benchmarks/__init__.py
+#       
+#       Copyright © 2017, Flo Birée <flo@biree.name>
+#       
+#       This file is a part of seafform.
+#       
+#       This program is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU Affero General Public License as 
+#       published by the Free Software Foundation, either version 3 of the 
+#       License, or (at your option) any later version.
+#       
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU Affero General Public License for more details.
+#       
+#       You should have received a copy of the GNU Affero General Public License
+#       along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#       
+###############################################################################
+"""Seafform benchmarks
+
+Run them from the seafformsite directory, eg:
+    python -m benchmarks.bench_seafile
+    python -m benchmarks.bench_form --rows 10 1000 100000
+
+bench_seafile: latency of the Seafile requests, with and without kept-alive
+    connections
+bench_form: form load, table view, post and file browser, on synthetic forms
+    (see synthetic.py) read locally or from a stub Seafile server
+"""
+
+__author__ = "Flo Birée"
+__version__ = "0.2"
+__license__ = "AGPLv3"
+__copyright__ = "Copyright © 2017, Flo Birée <flo@biree.name>"
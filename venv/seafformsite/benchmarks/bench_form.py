@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#       benchmarks/bench_form.py
+#       
+#       Copyright © 2017, Flo Birée <flo@biree.name>
+#       
+#       This file is a part of seafform.
+#       
+#       This program is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU Affero General Public License as 
+#       published by the Free Software Foundation, either version 3 of the 
+#       License, or (at your option) any later version.
+#       
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU Affero General Public License for more details.
+#       
+#       You should have received a copy of the GNU Affero General Public License
+#       along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#       
+###############################################################################
+"""Form load/post pipeline benchmark
+
+Measure, on synthetic forms of several sizes, the form load (parsing the ODS
+file, or from the form cache), the table view, the post of a new row and the
+file browser listing, in LOCAL mode and against a stub Seafile server.
+
+The time spent in each stage (see seafform.timing) is reported for each
+operation.
+
+Usage (from the seafformsite directory):
+    python -m benchmarks.bench_form [--rows N [N …]] [--cols N] [--rounds N]
+                                    [--modes local seafile]
+"""
+
+__author__ = "Flo Birée"
+__version__ = "0.2"
+__license__ = "AGPLv3"
+__copyright__ = "Copyright © 2017, Flo Birée <flo@biree.name>"
+
+import os
+import shutil
+import argparse
+import datetime
+import tempfile
+import statistics
+from collections import OrderedDict
+from time import perf_counter
+import django
+from django.conf import settings
+from benchmarks.stub_seafile import StubSeafile, TOKEN
+from benchmarks.synthetic import generate_form
+
+EMAIL = 'bench@example.org'
+PASSWORD = 'bench'
+
+def setup_django(local_root, seafile_url):
+    """Configure a minimal seafform site, with an in-memory database"""
+    settings.configure(
+        SECRET_KEY='benchmarks',
+        ALLOWED_HOSTS=['*'],
+        INSTALLED_APPS=(
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'django.contrib.sessions',
+            'django.contrib.messages',
+            'django.contrib.staticfiles',
+            'seafform',
+            'bootstrapform',
+        ),
+        MIDDLEWARE_CLASSES=(
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            'django.middleware.common.CommonMiddleware',
+            'django.contrib.auth.middleware.AuthenticationMiddleware',
+            'django.contrib.messages.middleware.MessageMiddleware',
+        ),
+        ROOT_URLCONF='seafform.urls',
+        TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'APP_DIRS': True,
+            'OPTIONS': {
+                'context_processors': [
+                    'django.contrib.auth.context_processors.auth',
+                    'django.template.context_processors.i18n',
+                    'django.template.context_processors.static',
+                    'django.contrib.messages.context_processors.messages',
+                ],
+            },
+        }],
+        DATABASES={
+            'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': ':memory:',
+            }
+        },
+        LANGUAGE_CODE='en-us',
+        USE_I18N=True,
+        USE_TZ=True,
+        STATIC_URL='/static/',
+        SEAFILE_ROOT=seafile_url,
+        TPL_URL=seafile_url,
+        ROOT_URL='http://testserver/',
+        VERIFYCERTS=True,
+        ALLOW_PUBLIC=False,
+        PUBLIC_NEED_AUTH=True,
+        LOCAL=True,
+        LOCAL_ROOT=local_root,
+    )
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+def login(seafile_url):
+    """Create the benchmark user, return a logged in test client"""
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from seafform.models import SeafileUser
+    user = User.objects.create_user(EMAIL, EMAIL, PASSWORD)
+    SeafileUser(user=user, seafroot=seafile_url, seaftoken=TOKEN).save()
+    client = Client()
+    client.login(username=EMAIL, password=PASSWORD)
+    return client, user
+
+def post_data(seafform):
+    """Return valid POST data for a new row of `seafform`"""
+    from seafform import seafform as sf
+    data = {'rowid': 'newrow'}
+    today = datetime.date.today()
+    for field in seafform.fields:
+        if isinstance(field, sf.StaticField):
+            continue
+        elif isinstance(field, (sf.BooleanField, sf.BooleanTrueField)):
+            data[field.label] = 'on'
+        elif isinstance(field, sf.NumberField):
+            data[field.label] = '42'
+        elif isinstance(field, sf.ListField):
+            data[field.label] = field.choices[0]
+        elif isinstance(field, sf.DateField):
+            data[field.label + '_year'] = str(today.year)
+            data[field.label + '_month'] = str(today.month)
+            data[field.label + '_day'] = str(today.day)
+        else:
+            data[field.label] = 'Benchmark answer'
+    return data
+
+def measure(results, name, func, *args, **kwargs):
+    """Run func(*args, **kwargs), add its duration and stage timings to
+        results[name], and return its result
+    """
+    from seafform import timing
+    with timing.collect() as timings:
+        start = perf_counter()
+        result = func(*args, **kwargs)
+        duration = perf_counter() - start
+    results.setdefault(name, []).append((duration, timings))
+    return result
+
+def run(client, user, form, rounds):
+    """Run `rounds` times each operation on `form`
+
+        Return {operation: [(duration, Timings)]}
+    """
+    from seafform import views
+    from seafform.seafform import SeafForm
+    seaf = None if settings.LOCAL else views._seafile_of(user)
+    url = '/form/{0}/'.format(form.formid)
+    results = OrderedDict()
+    for i in range(rounds):
+        # parse the ODS file
+        seafform = SeafForm(form.filepath, seaf, form.repoid)
+        measure(results, 'load', seafform.load)
+        views.form_cache.clear()
+        # from the form cache (the first load fills it)
+        for name in ('load (first)', 'load (cached)'):
+            seafform = SeafForm(
+                form.filepath, seaf, form.repoid, cache=views.form_cache
+            )
+            measure(results, name, seafform.load)
+        response = measure(results, 'table view', client.get, url)
+        assert response.status_code == 200, response.status_code
+        response = measure(
+            results, 'post', client.post, url, post_data(seafform)
+        )
+        assert response.status_code == 200, response.status_code
+        if seaf is not None:
+            views.listing_cache.invalidate(seaf)
+        response = measure(
+            results, 'lsdir', client.post, '/private/lsdir/',
+            {'dir': '/Forms/'}
+        )
+        assert response.status_code == 200, response.status_code
+        measure(
+            results, 'lsdir (cached)', client.post, '/private/lsdir/',
+            {'dir': '/Forms/'}
+        )
+    return results
+
+def report(name, results):
+    """Print a results line for each operation, with its stages durations"""
+    print(name)
+    for op, measures in results.items():
+        durations = [duration for duration, timings in measures]
+        stages = OrderedDict()
+        for duration, timings in measures:
+            for stage, (count, total) in timings.stages.items():
+                stages[stage] = stages.get(stage, 0.0) + total
+        print('    {0:15} mean {1:9.2f} ms  median {2:9.2f} ms  {3}'.format(
+            op,
+            statistics.mean(durations) * 1000,
+            statistics.median(durations) * 1000,
+            ' '.join(
+                '{0}={1:.1f}'.format(stage, total / len(measures) * 1000)
+                for stage, total in stages.items()
+            )
+        ))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+',
+                        default=[10, 1000, 10000],
+                        help='numbers of answers of the synthetic forms '
+                             '(default: 10 1000 10000)')
+    parser.add_argument('--cols', type=int, default=20,
+                        help='number of fields (default: 20)')
+    parser.add_argument('--rounds', type=int, default=5,
+                        help='number of runs of each operation (default: 5)')
+    parser.add_argument('--modes', nargs='+', default=['local', 'seafile'],
+                        choices=['local', 'seafile'],
+                        help='where forms are read from (default: both)')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='seafform-bench-')
+    try:
+        os.mkdir(os.path.join(root, 'Forms'))
+        with StubSeafile(root) as stub:
+            setup_django(root, stub.url)
+            from seafform.models import Form
+            client, user = login(stub.url)
+            for rows in args.rows:
+                filename = 'bench-{0}.ods'.format(rows)
+                generate_form(
+                    os.path.join(root, 'Forms', filename), rows, args.cols
+                )
+                for mode in args.modes:
+                    settings.LOCAL = (mode == 'local')
+                    form = Form.objects.create(
+                        owner=user,
+                        filepath=(
+                            os.path.join(root, 'Forms', filename)
+                            if settings.LOCAL else '/' + filename
+                        ),
+                        repoid=stub.repo_id('Forms'),
+                        reponame='Forms',
+                        formid='bench-{0}-{1}'.format(rows, mode),
+                        title='Synthetic form',
+                    )
+                    results = run(client, user, form, args.rounds)
+                    report('{0} rows x {1} columns, {2}'.format(
+                        rows, args.cols, mode
+                    ), results)
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#       benchmarks/bench_seafile.py
+#       
+#       Copyright © 2017, Flo Birée <flo@biree.name>
+#       
+#       This file is a part of seafform.
+#       
+#       This program is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU Affero General Public License as 
+#       published by the Free Software Foundation, either version 3 of the 
+#       License, or (at your option) any later version.
+#       
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU Affero General Public License for more details.
+#       
+#       You should have received a copy of the GNU Affero General Public License
+#       along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#       
+###############################################################################
+"""Seafile connector latency benchmark
+
+Compare the latency of the Seafile requests done by a form view, with a new
+connection for each request (like before connection pooling) and with the
+shared keep-alive connection pool, against a stub Seafile server.
+
+Usage (from the seafformsite directory):
+    python -m benchmarks.bench_seafile [--rounds N] [--handshake-delay S]
+"""
+
+__author__ = "Flo Birée"
+__version__ = "0.2"
+__license__ = "AGPLv3"
+__copyright__ = "Copyright © 2017, Flo Birée <flo@biree.name>"
+
+import os
+import io
+import shutil
+import argparse
+import tempfile
+import statistics
+from time import perf_counter
+import requests
+from seafform.seafile import Seafile, new_session
+from benchmarks.stub_seafile import StubSeafile, TOKEN
+
+FORMS_LIBRARY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', '..', '..', 'forms-library'
+)
+SAMPLE_FORM = os.path.join(FORMS_LIBRARY, 'examples_en', 'hiring-table.ods')
+
+class OneShotSession:
+    """Send each request with a new requests.Session, like the connector did
+        before connection pooling (module-level requests.get/post…)
+    """
+
+    def request(self, *args, **kwargs):
+        with requests.Session() as session:
+            return session.request(*args, **kwargs)
+
+    def get(self, *args, **kwargs):
+        with requests.Session() as session:
+            return session.get(*args, **kwargs)
+
+    def send(self, *args, **kwargs):
+        with requests.Session() as session:
+            return session.send(*args, **kwargs)
+
+def form_view_requests(seaf, repo_id, path):
+    """Seafile requests of a form view followed by a submission
+
+        Return {operation: duration}
+    """
+    timings = {}
+    start = perf_counter()
+    seaf.stat_file(repo_id, path)
+    timings['stat'] = perf_counter() - start
+
+    start = perf_counter()
+    odsfile = seaf.open_file(repo_id, path)
+    content = odsfile.read()
+    odsfile.close()
+    timings['download'] = perf_counter() - start
+
+    start = perf_counter()
+    fileo = io.BytesIO(content)
+    fileo.name = os.path.basename(path)
+    seaf.update_file(repo_id, path, fileo)
+    timings['update'] = perf_counter() - start
+
+    timings['total'] = sum(timings.values())
+    return timings
+
+def run(stub, repo_id, path, session, rounds):
+    """Run `rounds` form views with `session`
+
+        Return ({operation: [durations]}, number of new connections)
+    """
+    seaf = Seafile(stub.url, session=session)
+    seaf.authenticate('bench@example.org', token=TOKEN, validate=False)
+    connections = stub.connections
+    results = {}
+    for i in range(rounds):
+        for op, duration in form_view_requests(seaf, repo_id, path).items():
+            results.setdefault(op, []).append(duration)
+    return results, stub.connections - connections
+
+def report(name, results, connections, rounds):
+    """Print a results line for each operation"""
+    print('{0} ({1} connections for {2} views)'.format(
+        name, connections, rounds
+    ))
+    for op, durations in results.items():
+        print('    {0:10} mean {1:7.2f} ms   median {2:7.2f} ms'.format(
+            op,
+            statistics.mean(durations) * 1000,
+            statistics.median(durations) * 1000,
+        ))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rounds', type=int, default=50,
+                        help='number of form views (default: 50)')
+    parser.add_argument('--handshake-delay', type=float, default=0.02,
+                        help='time spent by the stub server on each new '
+                             'connection, to emulate TLS (default: 0.02s)')
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='time spent by the stub server on each '
+                             'request (default: 0s)')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='seafform-bench-')
+    try:
+        os.mkdir(os.path.join(root, 'Forms'))
+        shutil.copy(SAMPLE_FORM, os.path.join(root, 'Forms', 'form.ods'))
+        with StubSeafile(root, args.handshake_delay, args.delay) as stub:
+            repo_id = stub.repo_id('Forms')
+            for name, session in (
+                    ('new connection per request', OneShotSession()),
+                    ('pooled keep-alive connections', new_session()),
+                ):
+                results, connections = run(
+                    stub, repo_id, '/form.ods', session, args.rounds
+                )
+                report(name, results, connections, args.rounds)
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#       benchmarks/stub_seafile.py
+#       
+#       Copyright © 2017, Flo Birée <flo@biree.name>
+#       
+#       This file is a part of seafform.
+#       
+#       This program is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU Affero General Public License as 
+#       published by the Free Software Foundation, either version 3 of the 
+#       License, or (at your option) any later version.
+#       
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU Affero General Public License for more details.
+#       
+#       You should have received a copy of the GNU Affero General Public License
+#       along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#       
+###############################################################################
+"""Stub Seafile server, for benchmarks
+
+Serve the subdirectories of a local directory as Seafile libraries, through
+the small subset of the Seafile web API used by seafform.
+"""
+
+__author__ = "Flo Birée"
+__version__ = "0.2"
+__license__ = "AGPLv3"
+__copyright__ = "Copyright © 2017, Flo Birée <flo@biree.name>"
+
+import os
+import json
+import time
+import socket
+import hashlib
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs, quote, unquote
+
+TOKEN = 'stubtoken'
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Handle Seafile API requests for a StubSeafile server"""
+
+    protocol_version = 'HTTP/1.1' # keep-alive
+
+    def setup(self):
+        """New connection: emulate the cost of a TLS handshake"""
+        BaseHTTPRequestHandler.setup(self)
+        # do not wait for delayed ACKs between headers and body
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.stub.connections += 1
+        if self.server.stub.handshake_delay:
+            time.sleep(self.server.stub.handshake_delay)
+
+    def log_message(self, format, *args):
+        """Silent server"""
+        pass
+
+    def _send(self, body, status=200, ctype='application/json'):
+        """Send the response `body` (bytes, or data to be json-encoded)"""
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, method):
+        """Dispatch the request to the stub method"""
+        stub = self.server.stub
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = unquote(url.path)
+        if stub.delay:
+            time.sleep(stub.delay)
+        stub.requests += 1
+        try:
+            self._send(*stub.handle(method, path, query, self))
+        except KeyError:
+            self._send({'error_msg': 'Not found'}, 404)
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+    def read_multipart(self):
+        """Return the {name: bytes} content of a multipart/form-data body"""
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        msg = BytesParser(policy=HTTP).parsebytes(
+            b'Content-Type: ' + self.headers['Content-Type'].encode('ascii') +
+            b'\r\n\r\n' + body
+        )
+        return {
+            part.get_param('name', header='content-disposition'):
+                part.get_payload(decode=True)
+            for part in msg.iter_parts()
+        }
+
+class StubSeafile:
+    """Stub Seafile server serving `root` subdirectories as libraries
+
+        `handshake_delay` is the time in seconds spent on each new
+            connection (to emulate TLS handshakes)
+        `delay` is the time in seconds spent on each request
+    """
+
+    def __init__(self, root, handshake_delay=0.0, delay=0.0,
+                       host='127.0.0.1', port=0):
+        self.root = root
+        self.handshake_delay = handshake_delay
+        self.delay = delay
+        self.connections = 0
+        self.requests = 0
+        self._server = ThreadingHTTPServer((host, port), StubHandler)
+        self._server.stub = self
+        self._thread = None
+        self.url = 'http://%s:%d/' % self._server.server_address
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        """Start serving in a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the server"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def repo_id(name):
+        """Return the library id of the directory `name`"""
+        return str(hashlib.md5(name.encode('utf8')).hexdigest())
+
+    def _repos(self):
+        """Return the {repo_id: directory name} of libraries"""
+        return {
+            self.repo_id(name): name for name in sorted(os.listdir(self.root))
+            if os.path.isdir(os.path.join(self.root, name))
+        }
+
+    def _abspath(self, repo_id, path):
+        """Return the local path of `repo_id`/`path`"""
+        return os.path.join(
+            self.root, self._repos()[repo_id], path.lstrip('/')
+        )
+
+    def handle(self, method, path, query, handler):
+        """Return the (body, status) response for the request"""
+        parts = path.strip('/').split('/')
+        if parts[0] == 'files': # file download
+            with open(self._abspath(parts[1], '/'.join(parts[2:])), 'rb') as f:
+                return f.read(), 200, 'application/octet-stream'
+        if parts[0] == 'upload-api': # file upload
+            return self._upload(parts[1], parts[2], handler.read_multipart())
+        cmd = '/'.join(parts[1:]) + '/'
+        if cmd in ('ping/', 'auth/ping/'):
+            return 'pong', 200
+        if cmd == 'auth-token/':
+            handler.rfile.read(int(handler.headers['Content-Length']))
+            return {'token': TOKEN}, 200
+        if cmd == 'repos/':
+            return [
+                {
+                    'id': repo_id, 'name': name, 'type': 'repo',
+                    'permission': 'rw', 'encrypted': False,
+                } for repo_id, name in self._repos().items()
+            ], 200
+        repo_id, cmd = parts[2], '/'.join(parts[3:]) + '/'
+        if cmd == 'dir/':
+            abspath = self._abspath(repo_id, query.get('p', '/'))
+            return [
+                {
+                    'id': self.repo_id(entry.path),
+                    'type': 'dir' if entry.is_dir() else 'file',
+                    'name': entry.name,
+                    'size': 0 if entry.is_dir() else entry.stat().st_size,
+                } for entry in os.scandir(abspath)
+            ], 200
+        if cmd == 'file/':
+            return (self.url + 'files/' + repo_id +
+                    quote(query['p'])), 200
+        if cmd == 'file/detail/':
+            abspath = self._abspath(repo_id, query['p'])
+            with open(abspath, 'rb') as f:
+                fid = hashlib.sha1(f.read()).hexdigest()
+            return {
+                'id': fid,
+                'mtime': int(os.path.getmtime(abspath)),
+                'type': 'file',
+                'name': os.path.basename(abspath),
+                'size': os.path.getsize(abspath),
+            }, 200
+        if cmd in ('update-link/', 'upload-link/'):
+            return (self.url + 'upload-api/' + cmd.split('-')[0] + '/' +
+                    repo_id), 200
+        raise KeyError(path)
+
+    def _upload(self, action, repo_id, fields):
+        """Upload or update a file"""
+        if action == 'update':
+            abspath = self._abspath(repo_id, fields['target_file'].decode())
+        else:
+            abspath = os.path.join(
+                self._abspath(repo_id, fields['parent_dir'].decode()),
+                fields['filename'].decode()
+            )
+        with open(abspath, 'wb') as f:
+            f.write(fields['file'])
+        fid = hashlib.sha1(fields['file']).hexdigest()
+        return fid.encode('ascii'), 200, 'text/plain'
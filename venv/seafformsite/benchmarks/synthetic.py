@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#       benchmarks/synthetic.py
+#       
+#       Copyright © 2017, Flo Birée <flo@biree.name>
+#       
+#       This file is a part of seafform.
+#       
+#       This program is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU Affero General Public License as 
+#       published by the Free Software Foundation, either version 3 of the 
+#       License, or (at your option) any later version.
+#       
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU Affero General Public License for more details.
+#       
+#       You should have received a copy of the GNU Affero General Public License
+#       along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#       
+###############################################################################
+"""Synthetic forms generator, for benchmarks
+
+Generate forms in the layout of the forms-library template (fields headers on
+the first rows, properties in column A, answers in the Data sheet), with any
+number of rows and columns.
+
+Usage (from the seafformsite directory):
+    python -m benchmarks.synthetic [--rows N] [--cols N] output.ods
+"""
+
+__author__ = "Flo Birée"
+__version__ = "0.2"
+__license__ = "AGPLv3"
+__copyright__ = "Copyright © 2017, Flo Birée <flo@biree.name>"
+
+import os
+import argparse
+import zipfile
+import tempfile
+from xml.sax.saxutils import escape, quoteattr
+
+FORMS_LIBRARY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', '..', '..', 'forms-library'
+)
+TEMPLATE = os.path.join(FORMS_LIBRARY, 'templates', 'form_template_en.ods')
+
+# fields types of the columns, repeated over all the columns
+FIELD_TYPES = (
+    'static', 'text', 'number', 'check', 'date', 'list', 'longtext', 'check',
+)
+LIST_CHOICES = ('First choice', 'Second choice', 'Third choice')
+# column A labels (with the template non-breaking spaces)
+HEADERS_LABELS = (
+    'Field title\xa0→', 'Format →', 'Parameters →', 'Description\xa0→',
+)
+
+DATA_TABLE_START = '<table:table table:name="Data"'
+TABLE_END = '</table:table>'
+
+def _cell(value):
+    """Return the table:table-cell element of `value`"""
+    if value is None:
+        return '<table:table-cell/>'
+    elif isinstance(value, (int, float)):
+        return (
+            '<table:table-cell office:value-type="float" office:value="{0}">'
+            '<text:p>{0}</text:p></table:table-cell>'.format(value)
+        )
+    elif isinstance(value, tuple): # ('date', iso date)
+        return (
+            '<table:table-cell office:value-type="date" '
+            'office:date-value="{0}"><text:p>{0}</text:p>'
+            '</table:table-cell>'.format(value[1])
+        )
+    return (
+        '<table:table-cell office:value-type="string"><text:p>{0}</text:p>'
+        '</table:table-cell>'.format(escape(value))
+    )
+
+def _row(values):
+    """Return the table:table-row element of the list `values`"""
+    return '<table:table-row>{0}</table:table-row>\n'.format(
+        ''.join(_cell(value) for value in values)
+    )
+
+def field_type(colid):
+    """Return the field type of the column `colid` (from 1)"""
+    return FIELD_TYPES[(colid - 1) % len(FIELD_TYPES)]
+
+def answer(rowid, colid):
+    """Return the synthetic answer of the row `rowid` for the column `colid`
+        (from 1), or None
+    """
+    ftype = field_type(colid)
+    if ftype == 'static':
+        return 'Item {0}'.format(rowid)
+    elif ftype in ('text', 'longtext'):
+        return 'Answer {0}.{1}'.format(rowid, colid)
+    elif ftype == 'number':
+        return rowid % 100
+    elif ftype == 'check':
+        return 1 if (rowid + colid) % 3 == 0 else None
+    elif ftype == 'date':
+        return ('date', '2017-{0:02}-{1:02}'.format(
+            rowid % 12 + 1, rowid % 28 + 1
+        ))
+    elif ftype == 'list':
+        return LIST_CHOICES[rowid % len(LIST_CHOICES)]
+
+def properties(title, description, view_as, edit, public):
+    """Return the {row id: value} of column A properties"""
+    return {
+        5: 'Main title ↓', 6: title,
+        7: 'Main description ↓', 8: description,
+        9: 'View as ↓', 10: view_as,
+        11: 'Editing ↓', 12: 'yes' if edit else 'no',
+        13: 'Public ↓', 14: 'yes' if public else 'no',
+    }
+
+def iter_data_rows(rows, cols, props):
+    """Iterate over the table:table-row elements of the Data sheet"""
+    ids = range(1, cols + 1)
+    headers = (
+        ['Field {0}'.format(colid) for colid in ids],
+        [field_type(colid) + ('*' if colid == 1 else '') for colid in ids],
+        [
+            ', '.join(LIST_CHOICES) if field_type(colid) == 'list' else None
+            for colid in ids
+        ],
+        ['Description of field {0}'.format(colid) for colid in ids],
+    )
+    for label, values in zip(HEADERS_LABELS, headers):
+        yield _row([label] + values)
+    # answers, and properties in column A
+    for rowid in range(4, max(rows + 4, max(props) + 1)):
+        values = [props.get(rowid)]
+        if rowid < rows + 4:
+            values += [answer(rowid - 4, colid) for colid in ids]
+        yield _row(values)
+
+def write_data_sheet(path, rows, cols):
+    """Write into `path` a copy of the forms-library template, where the Data
+        sheet has `cols` columns (after column A) and the table:table-row
+        elements of the iterable `rows`
+    """
+    with zipfile.ZipFile(TEMPLATE) as template:
+        content = template.read('content.xml').decode('utf8')
+        # replace the content of the Data sheet
+        start = content.index(DATA_TABLE_START)
+        start = content.index('>', start) + 1
+        end = content.index(TABLE_END, start)
+        # the content can be large: build it in a temporary file
+        with tempfile.NamedTemporaryFile('w', encoding='utf8',
+                                         delete=False) as tmpfile:
+            tmpfile.write(content[:start])
+            tmpfile.write(
+                '<table:table-column table:number-columns-repeated='
+                '{0}/>'.format(quoteattr(str(cols + 1)))
+            )
+            for row in rows:
+                tmpfile.write(row)
+            tmpfile.write(content[end:])
+            tmpname = tmpfile.name
+        try:
+            with zipfile.ZipFile(path, 'w') as odszip:
+                # mimetype first, as in the template
+                for info in template.infolist():
+                    if info.filename == 'content.xml':
+                        odszip.write(tmpname, 'content.xml',
+                                     zipfile.ZIP_DEFLATED)
+                    else:
+                        odszip.writestr(info, template.read(info))
+        finally:
+            os.unlink(tmpname)
+    return path
+
+def generate_form(path, rows, cols=20, title='Synthetic form',
+                  description='Generated for benchmarks', view_as='table',
+                  edit=True, public=False):
+    """Write a form with `rows` answers and `cols` fields into `path`"""
+    props = properties(title, description, view_as, edit, public)
+    return write_data_sheet(path, iter_data_rows(rows, cols, props), cols)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=1000,
+                        help='number of answers (default: 1000)')
+    parser.add_argument('--cols', type=int, default=20,
+                        help='number of fields (default: 20)')
+    parser.add_argument('output', help='ODS file to write')
+    args = parser.parse_args()
+    generate_form(args.output, args.rows, args.cols)
+
+if __name__ == '__main__':
+    main()
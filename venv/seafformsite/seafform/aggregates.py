@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#       seafform/aggregates.py
+#       
+#       Copyright © 2017, Flo Birée <flo@biree.name>
+#       
+#       This file is a part of seafform.
+#       
+#       This program is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU Affero General Public License as 
+#       published by the Free Software Foundation, either version 3 of the 
+#       License, or (at your option) any later version.
+#       
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU Affero General Public License for more details.
+#       
+#       You should have received a copy of the GNU Affero General Public License
+#       along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#       
+###############################################################################
+"""Seafform columns aggregates, displayed below the table view"""
+
+__author__ = "Flo Birée"
+__version__ = "0.2"
+__license__ = "AGPLv3"
+__copyright__ = "Copyright © 2017, Flo Birée <flo@biree.name>"
+
+def _is_number(value):
+    """True if `value` can be summed"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+class ColumnAggregates:
+    """Statistics of each column of a form data
+
+        For each field: the number of non-empty values, the sum of numbers
+        (number fields) and the number of checked boxes (check fields).
+    """
+
+    def __init__(self, fields, data=()):
+        """Compute the aggregates of `data`, the rows of `fields` values"""
+        self.idents = [field.ident for field in fields]
+        self.count = [0] * len(self.idents)
+        self.sum = [0] * len(self.idents)
+        self.checked = [0] * len(self.idents)
+        # one pass for each column
+        for colid, column in enumerate(zip(*data)):
+            if colid >= len(self.idents):
+                break
+            values = [value for value in column if value]
+            self.count[colid] = len(values)
+            if self.idents[colid].startswith('check'):
+                self.checked[colid] = len(values)
+            elif self.idents[colid] == 'number':
+                self.sum[colid] = sum(v for v in values if _is_number(v))
+
+    def __repr__(self):
+        return "<ColumnAggregates({0})>".format(self.computations())
+
+    def copy(self):
+        """Return a copy of the aggregates"""
+        other = ColumnAggregates(())
+        other.idents = self.idents
+        other.count = list(self.count)
+        other.sum = list(self.sum)
+        other.checked = list(self.checked)
+        return other
+
+    def _update(self, row, sign):
+        """Add (sign=1) or remove (sign=-1) the values of `row`"""
+        for colid, value in enumerate(row[:len(self.idents)]):
+            if not value:
+                continue
+            self.count[colid] += sign
+            if self.idents[colid].startswith('check'):
+                self.checked[colid] += sign
+            elif self.idents[colid] == 'number' and _is_number(value):
+                self.sum[colid] += sign * value
+
+    def add_row(self, row):
+        """Add the values of a new row"""
+        self._update(row, 1)
+
+    def replace_row(self, old_row, new_row):
+        """Replace the values of `old_row` by the ones of `new_row`"""
+        self._update(old_row, -1)
+        self._update(new_row, 1)
+
+    def computations(self):
+        """Return the list of the value to display for each column: the number
+            of checked boxes, the sum of numbers, or None
+        """
+        return [
+            self.checked[colid] if ident.startswith('check')
+            else self.sum[colid] if ident == 'number'
+            else None
+            for colid, ident in enumerate(self.idents)
+        ]
+
+    def max_checked_columns(self):
+        """Return the list of check columns with the most checked boxes"""
+        check_columns = [
+            colid for colid, ident in enumerate(self.idents)
+            if ident.startswith('check')
+        ]
+        max_chk = max([0] + [self.checked[colid] for colid in check_columns])
+        return [
+            colid for colid in check_columns
+            if self.checked[colid] == max_chk
+        ]
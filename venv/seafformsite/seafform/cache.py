@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#       seafform/cache.py
+#       
+#       Copyright © 2017, Flo Birée <flo@biree.name>
+#       
+#       This file is a part of seafform.
+#       
+#       This program is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU Affero General Public License as 
+#       published by the Free Software Foundation, either version 3 of the 
+#       License, or (at your option) any later version.
+#       
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU Affero General Public License for more details.
+#       
+#       You should have received a copy of the GNU Affero General Public License
+#       along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#       
+###############################################################################
+"""Seafform parsed forms cache"""
+
+__author__ = "Flo Birée"
+__version__ = "0.2"
+__license__ = "AGPLv3"
+__copyright__ = "Copyright © 2017, Flo Birée <flo@biree.name>"
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+class FormCache:
+    """Process-wide cache of parsed forms
+
+        Entries are parsed form states (see SeafForm._cache_state), keyed by
+        (repo_id, filepath), and only valid for the version (mtime and file id)
+        of the ODS file they were parsed from.
+    """
+
+    key_prefix = 'seafform:form:'
+
+    def __init__(self, maxsize=64, backend=None, timeout=None):
+        """New form cache, keeping at most `maxsize` forms in memory
+
+            `backend` is an optional Django cache (or any object with the
+                same get/set/delete methods), shared with other workers.
+            `timeout` is the expiration time of `backend` entries, in seconds
+                (None to use the backend default)
+        """
+        self.maxsize = maxsize
+        self.backend = backend
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<FormCache({0}/{1})>".format(len(self._entries), self.maxsize)
+
+    def _backend_key(self, key):
+        """Return the backend key of `key`, safe for memcached"""
+        return self.key_prefix + hashlib.sha1(
+            repr(key).encode('utf8')
+        ).hexdigest()
+
+    def _store(self, key, entry):
+        """Store `entry` in memory, evicting least recently used forms"""
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, key, version):
+        """Return the cached state for `key` if it was parsed from the
+            version `version` of the file, else None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == version:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                # outdated
+                del self._entries[key]
+        if self.backend is not None:
+            entry = self.backend.get(self._backend_key(key))
+            if entry is not None and entry[0] == version:
+                self._store(key, entry)
+                return entry[1]
+        return None
+
+    def set(self, key, version, state):
+        """Cache `state`, parsed from the version `version` of the file `key`"""
+        entry = (version, state)
+        self._store(key, entry)
+        if self.backend is not None and self.timeout is None:
+            self.backend.set(self._backend_key(key), entry)
+        elif self.backend is not None:
+            self.backend.set(self._backend_key(key), entry, self.timeout)
+
+    def invalidate(self, key):
+        """Remove `key` from the cache"""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.backend is not None:
+            self.backend.delete(self._backend_key(key))
+
+    def clear(self):
+        """Remove all forms from the memory cache"""
+        with self._lock:
+            self._entries.clear()
+
+class ListingCache:
+    """Short-lived cache of Seafile libraries and directories listings
+
+        Entries are kept per Seafile connector (server and user), for `ttl`
+        seconds.
+    """
+
+    def __init__(self, ttl=30, maxsize=1024):
+        """New listing cache, keeping at most `maxsize` listings for `ttl`
+            seconds
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<ListingCache({0}/{1}, {2}s)>".format(
+            len(self._entries), self.maxsize, self.ttl
+        )
+
+    def _get(self, key, compute):
+        """Return the cached value of `key`, or store the result of
+            `compute()` if missing or expired
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+        value = compute()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def repos(self, seaf):
+        """Return (list of libraries, {library name: library id}) of the
+            Seafile connector `seaf`
+        """
+        def compute():
+            repo_list = seaf.list_repos()
+            index = {}
+            for repo in repo_list:
+                # keep the first library of a name
+                index.setdefault(repo['name'], repo['id'])
+            return repo_list, index
+        return self._get((seaf.url, seaf.email), compute)
+
+    def repo_id(self, seaf, repo_name):
+        """Return the id of the library `repo_name`, or None"""
+        repo_id = self.repos(seaf)[1].get(repo_name)
+        if repo_id is None:
+            # may be a new library
+            self.invalidate(seaf)
+            repo_id = self.repos(seaf)[1].get(repo_name)
+        return repo_id
+
+    def list_dir(self, seaf, repo_id, path='/'):
+        """Return the content of the directory `repo_id`/`path`"""
+        return self._get(
+            (seaf.url, seaf.email, repo_id, path),
+            lambda: seaf.list_dir(repo_id, path)
+        )
+
+    def invalidate(self, seaf, repo_id=None, path=None):
+        """Remove the listings of `seaf`
+
+            If `repo_id` is given, only remove the directories of `repo_id`,
+            and if `path` is given, only the directory `repo_id`/`path`.
+        """
+        prefix = (seaf.url, seaf.email)
+        if repo_id is not None:
+            prefix += (repo_id,)
+            if path is not None:
+                prefix += (path,)
+        with self._lock:
+            for key in list(self._entries):
+                if key[:len(prefix)] == prefix:
+                    del self._entries[key]
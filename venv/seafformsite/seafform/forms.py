@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#       seafform/forms.py
+#       
+#       Copyright © 2015, Florian Birée <florian@biree.name>
+#       
+#       This file is a part of seafform.
+#       
+#       This program is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU Affero General Public License as 
+#       published by the Free Software Foundation, either version 3 of the 
+#       License, or (at your option) any later version.
+#       
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU Affero General Public License for more details.
+#       
+#       You should have received a copy of the GNU Affero General Public License
+#       along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#       
+###############################################################################
+"""Seafform Django forms description"""
+
+__author__ = "Florian Birée"
+__version__ = "0.2"
+__license__ = "AGPLv3"
+__copyright__ = "Copyright © 2015, Florian Birée <florian@biree.name>"
+
+import datetime
+import threading
+from collections import OrderedDict
+from django import forms
+from django.forms.extras.widgets import SelectDateWidget
+import seafform.seafform as seafform
+
+class LoginForm(forms.Form):
+    email = forms.EmailField()
+    password = forms.CharField(widget=forms.PasswordInput)
+    # autofocus to email
+    email.widget.attrs.update({'autofocus' : 'autofocus'})
+
+# number of DjForm subclasses kept by djform_class
+DJFORM_CACHE_SIZE = 256
+
+class DjForm(forms.Form):
+    """Base class of the forms generated by djform_class()"""
+    
+    required_css_class = 'required'
+
+    rowid = forms.CharField(widget=forms.HiddenInput, initial='newrow')
+    rowid.isstatic = False
+    
+    def __init__(self, *args, **kwargs):
+        forms.Form.__init__(self, *args, **kwargs)
+        # the class can be older than the current year: update the years of
+        # the date widgets (copied for this form)
+        this_year = datetime.date.today().year
+        for djfield in self.fields.values():
+            if isinstance(djfield.widget, SelectDateWidget):
+                djfield.widget.years = range(this_year, this_year + 10)
+
+def _djfield_of(field):
+    """Return the Django form field of the seafform.Field `field`, or None"""
+    stdparams = {
+        'label': field.label,
+        'required': field.required,
+        'help_text': field.description,
+    } 
+    djfield = None
+    if isinstance(field, seafform.TextField):
+        djfield = forms.CharField(**stdparams)
+    elif isinstance(field, seafform.LongTextField):
+        params = stdparams.copy()
+        params.update(widget = forms.Textarea)
+        djfield = forms.CharField(**params)
+    elif isinstance(field, seafform.ListField):
+        params = stdparams.copy()
+        params.update(choices = ((c, c) for c in field.choices))
+        djfield = forms.ChoiceField(**params)
+    elif isinstance(field, seafform.BooleanField):
+        params = stdparams.copy()
+        params.update(initial = False)
+        djfield = forms.BooleanField(**params)
+    elif isinstance(field, seafform.BooleanTrueField):
+        params = stdparams.copy()
+        params.update(initial = True)
+        djfield = forms.BooleanField(**params)
+    elif isinstance(field, seafform.DateField):
+        params = stdparams.copy()
+        params.update(widget = SelectDateWidget)
+        djfield = forms.DateField(**params)
+        djfield.widget.attrs.update(
+            {'style': 'width: 32%; display: inline-block;'}
+        )
+    elif isinstance(field, seafform.NumberField):
+        djfield = forms.FloatField(**stdparams)
+    elif isinstance(field, seafform.StaticField):
+        params = stdparams.copy()
+        params.update(widget=forms.HiddenInput)
+        params['required'] = False
+        djfield = forms.CharField(**params)
+        djfield.isstatic = True
+    
+    if djfield is not None and not hasattr(djfield, 'isstatic'):
+        djfield.isstatic = False
+    return djfield
+
+def _build_djform_class(fieldlist):
+    """Return a new DjForm subclass with the fields of `fieldlist`"""
+    base_fields = OrderedDict(DjForm.base_fields)
+    firstfield = None
+    
+    for field in fieldlist:
+        djfield = _djfield_of(field)
+        if djfield is not None:
+            base_fields[field.label] = djfield
+        
+        if firstfield is None:
+            firstfield = base_fields[field.label]
+    
+    # add autofocus to the first one
+    if firstfield is not None:
+        firstfield.widget.attrs.update({'autofocus' : 'autofocus'})
+    
+    # fields are copied by each form instance, they can be shared
+    djform_cls = type(str('DjForm'), (DjForm,), {})
+    djform_cls.base_fields = base_fields
+    return djform_cls
+
+_djform_classes = OrderedDict()
+_djform_classes_lock = threading.Lock()
+
+def djform_class(fieldlist):
+    """Return the DjForm subclass for the seafform.Field list `fieldlist`
+        
+        Classes are shared between forms with the same column headers, so
+        that rendering a form only binds data to an existing class.
+    """
+    key = tuple(
+        (type(field), field.label, field.description, field.params,
+         field.required)
+        for field in fieldlist
+    )
+    with _djform_classes_lock:
+        djform_cls = _djform_classes.get(key)
+        if djform_cls is not None:
+            _djform_classes.move_to_end(key)
+            return djform_cls
+    djform_cls = _build_djform_class(fieldlist)
+    with _djform_classes_lock:
+        _djform_classes[key] = djform_cls
+        while len(_djform_classes) > DJFORM_CACHE_SIZE:
+            _djform_classes.popitem(last=False)
+    return djform_cls
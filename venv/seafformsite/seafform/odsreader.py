@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#       seafform/odsreader.py
+#       
+#       Copyright © 2017, Flo Birée <flo@biree.name>
+#       
+#       This file is a part of seafform.
+#       
+#       This program is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU Affero General Public License as 
+#       published by the Free Software Foundation, either version 3 of the 
+#       License, or (at your option) any later version.
+#       
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU Affero General Public License for more details.
+#       
+#       You should have received a copy of the GNU Affero General Public License
+#       along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#       
+###############################################################################
+"""Streaming OpenDocumentSpreadsheet reader
+
+Read the cells values of a sheet without building the whole document tree,
+with the same values and row/column numbering than ezodf (so that a row found
+here can be written using ezodf).
+"""
+
+__author__ = "Flo Birée"
+__version__ = "0.2"
+__license__ = "AGPLv3"
+__copyright__ = "Copyright © 2017, Flo Birée <flo@biree.name>"
+
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+# ezodf default 'all_less_maxcount' expand strategy: rows and columns repeated
+# at least MAXCOUNT times appear only once
+MAXCOUNT = (32, 32)
+
+# XML namespaces
+OFFICE_NS = 'urn:oasis:names:tc:opendocument:xmlns:office:1.0'
+TABLE_NS = 'urn:oasis:names:tc:opendocument:xmlns:table:1.0'
+TEXT_NS = 'urn:oasis:names:tc:opendocument:xmlns:text:1.0'
+
+TABLE = '{%s}table' % TABLE_NS
+TABLE_NAME = '{%s}name' % TABLE_NS
+ROW = '{%s}table-row' % TABLE_NS
+ROWS_REPEATED = '{%s}number-rows-repeated' % TABLE_NS
+COLS_REPEATED = '{%s}number-columns-repeated' % TABLE_NS
+VALUE_TYPE = '{%s}value-type' % OFFICE_NS
+PARAGRAPHS = ('{%s}p' % TEXT_NS, '{%s}h' % TEXT_NS)
+SPANS = ('{%s}span' % TEXT_NS, '{%s}a' % TEXT_NS) + PARAGRAPHS
+SPACES = '{%s}s' % TEXT_NS
+SPACES_COUNT = '{%s}c' % TEXT_NS
+WHITESPACES = {
+    '{%s}tab' % TEXT_NS: '\t',
+    '{%s}line-break' % TEXT_NS: '\n',
+    '{%s}soft-page-break' % TEXT_NS: '',
+}
+
+NUMERIC_TYPES = ('float', 'percentage', 'currency')
+VALUE_ATTR = {
+    'float': '{%s}value' % OFFICE_NS,
+    'percentage': '{%s}value' % OFFICE_NS,
+    'currency': '{%s}value' % OFFICE_NS,
+    'date': '{%s}date-value' % OFFICE_NS,
+    'time': '{%s}time-value' % OFFICE_NS,
+    'boolean': '{%s}boolean-value' % OFFICE_NS,
+}
+
+class SheetNotFound(KeyError):
+    """Raised when the requested sheet is not in the document"""
+    pass
+
+def _repeat(count, maxcount):
+    """Return the number of times a row or column repeated `count` times
+        appears in ezodf
+    """
+    count = int(count)
+    return count if count < maxcount else 1
+
+def _plaintext(elem):
+    """Return the plain text of a text:p or text:span element"""
+    text = [elem.text]
+    for child in elem:
+        if child.tag in SPANS:
+            text.append(_plaintext(child))
+        elif child.tag == SPACES:
+            text.append(' ' * int(child.get(SPACES_COUNT, 1)))
+        elif child.tag in WHITESPACES:
+            text.append(WHITESPACES[child.tag])
+        else:
+            text.append(child.text)
+        text.append(child.tail)
+    return ''.join(filter(None, text))
+
+def cell_value(cell):
+    """Return the value of the cell element `cell`, like ezodf Cell.value"""
+    vtype = cell.get(VALUE_TYPE)
+    if vtype is None:
+        return None
+    elif vtype == 'string':
+        return '\n'.join(
+            _plaintext(child) for child in cell if child.tag in PARAGRAPHS
+        )
+    value = cell.get(VALUE_ATTR.get(vtype, ''))
+    if value is None:
+        return None
+    elif vtype in NUMERIC_TYPES:
+        return float(value)
+    elif vtype == 'boolean':
+        return (value == 'true')
+    return value
+
+def row_values(row, maxcols=MAXCOUNT[1]):
+    """Return the list of values of the row element `row`, without the
+        trailing empty cells
+    """
+    values = []
+    for cell in row:
+        value = cell_value(cell)
+        repeat = _repeat(cell.get(COLS_REPEATED, 1), maxcols)
+        values.extend([value] * repeat)
+    # strip trailing empty cells
+    while values and values[-1] is None:
+        values.pop()
+    return values
+
+def iter_rows(fileobj, sheet, maxcount=MAXCOUNT):
+    """Iterate over the rows of the sheet named `sheet` from the ODS file
+        `fileobj` (a file name, or a seekable file object)
+
+        Yield (rowid, values) for each row, where values is the list of the
+        row cell values, without the trailing empty cells (so empty rows have
+        an empty list of values).
+
+        Rows and cells are numbered like ezodf does with its default
+        'all_less_maxcount' expand strategy with `maxcount`.
+
+        Raise SheetNotFound if `sheet` is not in the document.
+    """
+    maxrows, maxcols = maxcount
+    with zipfile.ZipFile(fileobj) as odszip:
+        with odszip.open('content.xml') as content:
+            in_sheet = False
+            rowid = 0
+            for event, elem in iterparse(content, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag == TABLE and elem.get(TABLE_NAME) == sheet:
+                        in_sheet = True
+                    continue
+                if elem.tag == ROW and in_sheet:
+                    values = row_values(elem, maxcols)
+                    repeat = _repeat(elem.get(ROWS_REPEATED, 1), maxrows)
+                    for i in range(repeat):
+                        yield rowid + i, values
+                    rowid += repeat
+                    elem.clear()
+                elif elem.tag == TABLE and in_sheet:
+                    return
+                elif elem.tag in (ROW, TABLE):
+                    # other sheets
+                    elem.clear()
+    raise SheetNotFound(sheet)
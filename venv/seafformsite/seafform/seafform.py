@@ -0,0 +1,819 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#       seafform/seafform.py
+#       
+#       Copyright © 2015, Florian Birée <florian@biree.name>
+#       
+#       This file is a part of seafform.
+#       
+#       This program is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU Affero General Public License as 
+#       published by the Free Software Foundation, either version 3 of the 
+#       License, or (at your option) any later version.
+#       
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU Affero General Public License for more details.
+#       
+#       You should have received a copy of the GNU Affero General Public License
+#       along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#       
+###############################################################################
+"""Seafform forms description"""
+
+__author__ = "Florian Birée"
+__version__ = "0.2"
+__license__ = "AGPLv3"
+__copyright__ = "Copyright © 2015, Florian Birée <florian@biree.name>"
+
+import os
+import ezodf
+import shutil
+import time
+import datetime
+import itertools
+from tempfile import NamedTemporaryFile, SpooledTemporaryFile
+from seafform import odsreader
+from seafform.aggregates import ColumnAggregates
+from seafform.timing import stage
+if 'DJANGO_SETTINGS_MODULE' in os.environ:
+    from django.utils.translation import ugettext_noop 
+    from django.utils.translation import ugettext as _
+    from django.utils.translation import get_language
+else:
+    # Not in a Django environment
+    _ = lambda x:x
+    ugettext_noop = _
+    get_language = lambda: None
+
+HEADERS_ROW = 4  # number of headers row in ods files
+PROPERTIES_ROWS = (6, 8, 10, 12, 14) # title, description, view as, edit, public
+SPOOL_MAX_SIZE = 4 * 1024 * 1024 # downloaded ODS files kept in memory if less
+# value type attributes of ODS cells (including the LibreOffice extension)
+VALUE_TYPE_ATTRS = (
+    odsreader.VALUE_TYPE,
+    '{urn:org:documentfoundation:names:experimental:calc:xmlns:calcext:1.0}'
+    'value-type',
+)
+#all_less_maxcount strategy delete formats
+# trying all_but_last, then all
+#ezodf.config.set_table_expand_strategy('all_but_last')
+
+class InvalidODS(Exception):
+    """Raise when the ODS file doesn't respect the specification for Seafform
+    """
+    pass
+
+class RowNotFound(KeyError):
+    """Raise when the row to replace is not a data row"""
+    pass
+
+class Field:
+    """Base class for form fields"""
+    
+    def __init__(self, label, description=None, params=None, required=False, 
+                       value=None):
+        """Initialize a new field"""
+        self.label = label
+        self.description = description
+        self.params = params
+        self.required = required
+        self.value = value
+    
+    def __repr__(self):
+        if hasattr(self, 'ident'):
+            ftype = self.ident
+        else:
+            ftype = 'Field'
+        return '<{0}({1}){2}>'.format(
+            ftype,
+            self.label,
+            ('*' if self.required else '')
+        )
+
+class TextField(Field):
+    """Single-line text field"""
+    # Translators: field type for spreadsheet
+    ident = ugettext_noop('text')
+
+class LongTextField(Field):
+    """Multiline text field"""
+    # Translators: field type for spreadsheet
+    ident = ugettext_noop('longtext')
+
+class ListField(Field):
+    """List of choices field"""
+    # Translators: field type for spreadsheet
+    ident = ugettext_noop('list')
+    
+    def __init__(self, *args):
+        Field.__init__(self, *args)
+        self.choices = [
+            ch.strip() for ch in self.params.split(',')
+        ]
+
+class BooleanField(Field):
+    """Checkbox field"""
+    # Translators: field type for spreadsheet
+    ident = ugettext_noop('check')
+
+    def __init__(self, *args):
+        Field.__init__(self, *args)
+        self.value = False
+
+class BooleanTrueField(Field):
+    """Checked checkbox field"""
+    # Translators: field type for spreadsheet
+    ident = ugettext_noop('checked')
+    
+    def __init__(self, *args):
+        Field.__init__(self, *args)
+        self.value = True
+
+class DateField(Field):
+    """Date field"""
+    # Translators: field type for spreadsheet
+    ident = ugettext_noop('date')
+
+class NumberField(Field):
+    """Number field"""
+    # Translators: field type for spreadsheet
+    ident = ugettext_noop('number')
+
+class StaticField(Field):
+    """Non-editable field"""
+    # Translators: field type for spreadsheet
+    ident = ugettext_noop('static')
+
+# {language: {field ident or translated ident: Field subclass}}
+_field_classes = {}
+# {(language, raw values): translated values}
+_translations = {}
+
+def field_classes():
+    """Return the {ident: Field subclass} lookup table of the active language,
+        with both raw and translated idents
+    """
+    language = get_language()
+    try:
+        return _field_classes[language]
+    except KeyError:
+        classes = {}
+        for cls in Field.__subclasses__():
+            classes[_(cls.ident)] = cls
+            classes[cls.ident] = cls
+        _field_classes[language] = classes
+        return classes
+
+def field_of(ident):
+    """Return the Field subclass corresponding to `ident`
+    
+        Raise KeyError if `ident` is not a known field type
+    """
+    return field_classes()[ident]
+
+def translated(values):
+    """Return the list of translations of `values` in the active language"""
+    key = (get_language(), values)
+    try:
+        return _translations[key]
+    except KeyError:
+        l10n = _translations[key] = [_(v) for v in values]
+        return l10n
+
+def _cell_at(values, colid):
+    """Return the value at `colid` from a list of row values, or None"""
+    return values[colid] if colid < len(values) else None
+
+def _sheet_rows(odsdata):
+    """Iterate over the (rowid, values) of the Data sheet of the file object
+        `odsdata`, raise InvalidODS if there is no Data sheet
+    """
+    try:
+        yield from odsreader.iter_rows(odsdata, 'Data')
+    except odsreader.SheetNotFound:
+        raise InvalidODS
+
+def _split_rows(rows):
+    """Split the (rowid, values) `rows` of the Data sheet from HEADERS_ROW
+        between data rows and the following ones
+        
+        Data rows go down to the last value of column B, then while cells
+        are not empty, column by column. Yield (rowid, values, True) for each
+        data row, then (rowid, values, False) for each following row; only
+        the rows after the last value of column B are kept in memory.
+    """
+    following = [] # rows after the last value of column B
+    ncols = 0
+    for rowid, values in rows:
+        ncols = max(ncols, len(values))
+        if _cell_at(values, 1):
+            for prev_rowid, prev_values in following:
+                yield prev_rowid, prev_values, True
+            following = []
+            yield rowid, values, True
+        else:
+            following.append((rowid, values))
+    # go down while cells are not empty, column by column
+    data_count = 0
+    for colid in range(1, ncols):
+        while (data_count < len(following) and
+                _cell_at(following[data_count][1], colid)):
+            data_count += 1
+    for index, (rowid, values) in enumerate(following):
+        yield rowid, values, index < data_count
+
+def _clear_cell(cell):
+    """Remove the value of the ezodf `cell`, keeping its style"""
+    cell._clear_old_value()
+    for attr in VALUE_TYPE_ATTRS:
+        cell.xmlnode.attrib.pop(attr, None)
+
+def untranslate(loc_val, raw_list, loc_list):
+    """If loc_val in raw_list,
+        return loc_val
+    else:
+        Return the raw value at the same position in raw_list than
+        loc_val in loc_list
+    default to the first value
+    """
+    if loc_val in raw_list:
+        return loc_val
+    else:
+        try:
+            return raw_list[loc_list.index(loc_val)]
+        except ValueError:
+            return raw_list[0]
+
+class RowIndex:
+    """Index of the Data sheet rows
+    
+        Data rows go from HEADERS_ROW to the first empty row (excluded).
+        Rows with values after the first empty row are kept aside, and become
+        data rows when appended rows reach them.
+    """
+    
+    def __init__(self, first_empty_row=HEADERS_ROW, stray_rows=None):
+        """New index, `stray_rows` is the {row id: row data} of rows with
+            values after `first_empty_row`
+        """
+        self.first_empty_row = first_empty_row
+        self.stray_rows = stray_rows if stray_rows is not None else {}
+    
+    def __repr__(self):
+        return "<RowIndex({0}:{1})>".format(HEADERS_ROW, self.first_empty_row)
+    
+    def __len__(self):
+        """Number of data rows"""
+        return self.first_empty_row - HEADERS_ROW
+    
+    def __contains__(self, rowid):
+        """True if the sheet row `rowid` is a data row"""
+        return HEADERS_ROW <= rowid < self.first_empty_row
+    
+    def copy(self):
+        """Return a copy of the index"""
+        return RowIndex(self.first_empty_row, dict(self.stray_rows))
+    
+    def data_index(self, rowid):
+        """Return the index in SeafForm.data of the sheet row `rowid`
+            
+            Raise KeyError if `rowid` is not a data row
+        """
+        if rowid not in self:
+            raise KeyError(rowid)
+        return rowid - HEADERS_ROW
+    
+    def append(self):
+        """Use the first empty row for new values
+        
+            Return (row id, list of stray rows data following the new row)
+        """
+        rowid = self.first_empty_row
+        self.first_empty_row += 1
+        following = []
+        while self.first_empty_row in self.stray_rows:
+            following.append(self.stray_rows.pop(self.first_empty_row))
+            self.first_empty_row += 1
+        return rowid, following
+
+class SeafForm:
+    """Build and fill a form from an OpenDocumentSpreadsheet file"""
+    # Translators: ODS view mode
+    _view_as_values = (ugettext_noop('table'), ugettext_noop('form'))
+    # Translators: ODS edit, yes or no
+    _edit_values = (ugettext_noop('yes'), ugettext_noop('no'))
+    # Translators: ODS public, yes or no
+    _public_values = (ugettext_noop('yes'), ugettext_noop('no'))
+
+    def __init__(self, filepath, seaf=None, repo_id=None, cache=None):
+        """Initialize a form for the file `filepath`.
+
+            If seaf is a Seafile instance, repo_id must be the
+            Seafile identifier of the repository where `filepath` is.
+
+            If seaf is None, load `filepath` from the local filesystem
+
+            If cache is a seafform.cache.FormCache instance, the parsed form
+            is shared through it, and only reloaded when `filepath` changes.
+        """
+        # source properties
+        self.filepath = filepath
+        self.seaf = seaf
+        self.repo_id = repo_id
+        self.cache = cache
+        self.loaded = False
+
+        # form properties
+        self.title = None
+        self.description = None
+        self.fields = None
+        self.data = None
+        self.view_as = None # ('table' or 'form')
+        self.edit = None
+        self.public = None
+        
+        # cached items
+        self.mtime = None
+        self.version = None # (mtime, Seafile file id)
+        self.odsfile = None
+        self._odsdata = None
+        self.rows = None # RowIndex
+        self.aggregates = None # ColumnAggregates
+
+    def __repr__(self):
+        """Representation of the form"""
+        if self.loaded:
+            return "<SeafForm({0}:{1})>".format(self.filepath, self.title)
+        else:
+            return "<SeafForm({0}:unloaded)>".format(self.filepath)
+
+    @property
+    def cache_key(self):
+        """Key of this form in the form cache"""
+        return (self.repo_id, self.filepath)
+
+    def load(self):
+        """Load form data from the form cache, or from the ODS file if the
+            cached form is missing or outdated
+        """
+        version = self._get_version()
+        if not self._load_cached(version):
+            self._load_file(version)
+    
+    def iter_file_data(self):
+        """Load the form properties and fields, and iterate over the data
+            rows, like iter_data()
+            
+            If the form is not in the form cache, the data rows are read from
+            the ODS file while iterating, without keeping them in memory:
+            the form data is not loaded.
+        """
+        version = self._get_version()
+        if self._load_cached(version):
+            return self.iter_data()
+        odsdata = self._fetch()
+        try:
+            rows = self._read_sheet(odsdata)
+        except:
+            odsdata.close()
+            raise
+        return self._iter_rows_data(odsdata, rows)
+    
+    def _iter_rows_data(self, odsdata, rows):
+        """Iterate over the data rows of the Data sheet `rows` read from the
+            file object `odsdata`, then close it
+        """
+        try:
+            for rowid, values, is_data in _split_rows(rows):
+                if not is_data:
+                    break
+                yield rowid - HEADERS_ROW, self._row_data(values)
+        finally:
+            odsdata.close()
+    
+    def _load_cached(self, version):
+        """Load form data from the form cache, if it has the form at
+            `version`
+            
+            Return True if the form was loaded
+        """
+        if self.cache is None:
+            return False
+        state = self.cache.get(self.cache_key, version)
+        if state is None:
+            return False
+        self._restore_state(state)
+        self.odsfile = None # will be opened again if needed
+        self.version = version
+        self.mtime = version[0]
+        self.loaded = True
+        return True
+
+    def _load_file(self, version):
+        """Load form data from the ODS file, which version is `version`
+
+            The Data sheet is read in a single streaming pass, the ezodf
+            document is only opened by post() when the file is modified.
+        """
+        odsdata = self._fetch()
+        self.odsfile = None # outdated
+        
+        self.data = []
+        first_empty_row = HEADERS_ROW
+        stray_rows = {}
+        try:
+            with stage('load'):
+                rows = self._read_sheet(odsdata)
+                for rowid, values, is_data in _split_rows(rows):
+                    if is_data:
+                        self.data.append(self._row_data(values))
+                        first_empty_row = rowid + 1
+                    elif any(values[1:]): # column A is not data
+                        stray_rows[rowid] = self._row_data(values)
+        finally:
+            if self.seaf:
+                # kept to be opened by ezodf if needed
+                self._odsdata = odsdata
+            else:
+                odsdata.close()
+        self.rows = RowIndex(first_empty_row, stray_rows)
+        self.aggregates = ColumnAggregates(self.fields, self.data)
+        
+        self.version = version
+        self.mtime = version[0]
+        self.loaded = True
+        if self.cache is not None:
+            self.cache.set(self.cache_key, version, self._cache_state())
+    
+    def _read_sheet(self, odsdata):
+        """Read the properties and fields from the Data sheet of the file
+            object `odsdata`
+            
+            Return an iterator over the (rowid, values) of the sheet rows from
+            HEADERS_ROW (see odsreader.iter_rows)
+        """
+        rows = _sheet_rows(odsdata)
+        first_rows = [] # headers and properties rows
+        for rowid, values in rows:
+            first_rows.append(values)
+            if rowid == PROPERTIES_ROWS[-1]:
+                break
+        props = {
+            rowid: _cell_at(first_rows[rowid], 0)
+            for rowid in PROPERTIES_ROWS if rowid < len(first_rows)
+        }
+        
+        # get Properties
+        self.title = props.get(PROPERTIES_ROWS[0])
+        self.description = props.get(PROPERTIES_ROWS[1])
+        self.view_as = untranslate(
+            props.get(PROPERTIES_ROWS[2]),
+            self._view_as_values,
+            translated(self._view_as_values)
+        )
+        self.edit = ('yes' == (untranslate(
+            props.get(PROPERTIES_ROWS[3]),
+            self._edit_values,
+            translated(self._edit_values)
+        )))
+        self.public = ('yes' == (untranslate(
+            props.get(PROPERTIES_ROWS[4]),
+            self._public_values,
+            translated(self._public_values)
+        )))
+        
+        # get fields
+        headers = first_rows[:HEADERS_ROW]
+        headers += [[]] * (HEADERS_ROW - len(headers))
+        self.fields = []
+        classes = field_classes()
+        for colid in range(1, max(len(values) for values in headers)):
+            # get field data
+            fname, fformat, fparams, fdesc = (
+                _cell_at(values, colid) for values in headers
+            )
+            
+            # build field object (if fformat is known)
+            if fformat and fformat.strip('*') in classes:
+                frequired = (fformat.endswith('*'))
+                FType = classes[fformat.rstrip('*')]
+                self.fields.append(FType(
+                    fname, fdesc, fparams, frequired
+                ))
+        
+        return itertools.chain(
+            enumerate(first_rows[HEADERS_ROW:], HEADERS_ROW), rows
+        )
+    
+    def _get_version(self):
+        """Return the current version of the ODS file: (mtime, file id)
+        
+            Seafile mtimes have a one second resolution, the file id is used
+            to detect several changes during the same second.
+        """
+        if self.seaf:
+            s = self.seaf.stat_file(self.repo_id, self.filepath)
+            return (float(s['mtime']), s.get('id'))
+        else:
+            return (os.path.getmtime(self.filepath), None)
+    
+    def _cache_state(self):
+        """Return the parsed form state, to be stored in the form cache"""
+        return {
+            'title': self.title,
+            'description': self.description,
+            'view_as': self.view_as,
+            'edit': self.edit,
+            'public': self.public,
+            'fields': self.fields,
+            'data': list(self.data),
+            'rows': self.rows.copy(),
+            'aggregates': self.aggregates.copy(),
+        }
+    
+    def _restore_state(self, state):
+        """Restore the parsed form state from a form cache `state`"""
+        self.title = state['title']
+        self.description = state['description']
+        self.view_as = state['view_as']
+        self.edit = state['edit']
+        self.public = state['public']
+        self.fields = state['fields']
+        # rows are never modified in place, a copy of the list is enough
+        self.data = list(state['data'])
+        self.rows = state['rows'].copy()
+        self.aggregates = state['aggregates'].copy()
+    
+    def _row_data(self, values):
+        """Return the form data of a row from its cell values"""
+        row_data = []
+        for celid in range(1, len(self.fields) + 1):
+            val = _cell_at(values, celid)
+            if self.fields[celid-1].ident == 'date' and val:
+                try:
+                    s_time = time.strptime(val, '%Y-%m-%d')
+                except ValueError:
+                    pass # keep val as str
+                else:
+                    val = datetime.date(*s_time[:3])
+            elif self.fields[celid-1].ident.startswith('check') and val:
+                val = bool(val)
+            row_data.append(val)
+        return row_data
+    
+    def _fetch(self):
+        """Return a seekable file object of the ODS file"""
+        if not self.seaf:
+            return self._local_open()
+        seaf_f = self._seaf_open()
+        with stage('download'):
+            # save spreadsheet into a temporary file (zip files need to seek)
+            odsdata = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            shutil.copyfileobj(seaf_f, odsdata)
+            seaf_f.close()
+        odsdata.seek(0)
+        return odsdata
+    
+    def _open_odsfile(self):
+        """Open the ODS file as an ezodf document, to modify it"""
+        if not self.seaf:
+            self.odsfile = ezodf.opendoc(self.filepath)
+            return
+        if self._odsdata is not None:
+            odsdata, self._odsdata = self._odsdata, None
+            odsdata.seek(0)
+        else:
+            odsdata = self._fetch()
+        # ezodf realy doesn't like file-like objects…
+        with NamedTemporaryFile(delete=False) as tmpfile:
+            shutil.copyfileobj(odsdata, tmpfile)
+            tmpname = tmpfile.name
+        odsdata.close()
+        # open spreadsheet document
+        self.odsfile = ezodf.opendoc(tmpname)
+        # delete tmp file
+        os.unlink(tmpname)
+    
+    def _seaf_open(self):
+        """Return an opened file-like object from Seafile"""
+        return self.seaf.open_file(self.repo_id, self.filepath)
+
+    def _local_open(self):
+        """Return an opened file object from local filesystem"""
+        return open(self.filepath, 'rb')
+    
+    def post(self, values, replace_row=None):
+        """Post data from values into the ODS file
+
+            values is the dict of {ident: value}
+            optionaly replace values from the row `replace_row`
+            
+            Return the row id where values were saved, or None if all values
+            are empty (nothing is saved)
+            
+            Raise RowNotFound if `replace_row` is not a data row
+            
+            WARNING: type and required verification must be done before
+        """
+        result = self.post_rows([(values, replace_row)])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+    
+    def post_rows(self, rows):
+        """Post several rows into the ODS file, saving it only once
+        
+            rows is a list of (values, replace_row), as post() arguments
+            
+            Return a list with, for each row, the row id where values were
+            saved, or the exception which prevented to save them (RowNotFound
+            if replace_row is not a data row); the other rows are still saved.
+        """
+        results = [None] * len(rows)
+        todo = list(range(len(rows)))
+        while True:
+            datash = self._data_sheet()
+            exact = True # the row index matches the file
+            for index in todo:
+                values, replace_row = rows[index]
+                if replace_row is not None and replace_row not in self.rows:
+                    results[index] = RowNotFound(replace_row)
+                    continue
+                try:
+                    rowid = self._set_row(datash, values, replace_row)
+                except Exception as error:
+                    results[index] = error
+                    break
+                results[index] = rowid
+                if (rowid is not None and
+                        not _cell_at(self.data[rowid - HEADERS_ROW], 0)):
+                    # without value in column B, the data rows read from
+                    # the file may end elsewhere
+                    exact = False
+            else:
+                break
+            # the document and data may be partially modified: start again
+            # from the file, without the failed rows
+            self.version = None
+            todo = [
+                index for index in todo
+                if not isinstance(results[index], Exception)
+            ]
+        if all(result is None or isinstance(result, Exception)
+               for result in results):
+            return results # nothing to save
+        
+        if self.seaf:        
+            # save spreadsheet into a temporary file
+            with NamedTemporaryFile(delete=False) as tmpfile:
+                # ezodf realy doesn't like file-like objects…
+                tmpname = tmpfile.name
+            with stage('saveas'):
+                self.odsfile.saveas(tmpname)
+            
+            # update distant file
+            with open(tmpname, 'rb') as fileo:
+                fid = self.seaf.update_file(
+                    self.repo_id, self.filepath, fileo
+                )
+            # unlink tmp file
+            os.unlink(tmpname)
+        else:
+            # save spreadsheet into the local file
+            with stage('saveas'):
+                self.odsfile.saveas(self.filepath)
+        
+        # update the form cache with the saved version
+        version = self._get_version()
+        self.mtime = version[0]
+        if self.seaf and version[1] != fid.strip().strip('"'):
+            # saved again by another writer since: the data is outdated
+            exact = False
+        self.version = version
+        if not exact:
+            # read the file again next time
+            self.version = None
+            if self.cache is not None:
+                self.cache.invalidate(self.cache_key)
+        elif self.cache is not None:
+            self.cache.set(self.cache_key, self.version, self._cache_state())
+        return results
+    
+    def _data_sheet(self):
+        """Return the ezodf Data sheet of the up to date ODS file, of the same
+            version than the form data and row index
+        """
+        while True:
+            # get new version
+            new_version = self._get_version()
+            # if the file has changed:
+            if self.version != new_version:
+                self._load_file(new_version) # reload
+            if self.odsfile is None:
+                with stage('opendoc'):
+                    self._open_odsfile()
+                if self._get_version() != self.version:
+                    # changed before it was opened: the document may be
+                    # newer than the data, read it again
+                    self.odsfile = None
+                    continue
+            break
+        
+        # get the Data sheet
+        try:
+            return self.odsfile.sheets['Data']
+        except KeyError:
+            raise InvalidODS 
+    
+    def _set_row(self, datash, values, replace_row=None):
+        """Fill a row of the Data sheet `datash` with `values`, either the
+            first empty one or `replace_row`, where fields missing from
+            `values` are left unchanged
+            
+            Return the row id, or None if all values are empty and there is
+            no row to replace (no row is used)
+        """
+        if replace_row is None:
+            old_row = None
+        else:
+            index = self.rows.data_index(replace_row)
+            old_row = self.data[index]
+        row_data = []
+        kept = set() # columns missing from values, left unchanged
+        for colid, field in enumerate(self.fields):
+            if old_row is not None and field.label not in values:
+                kept.add(colid + 1)
+                row_data.append(old_row[colid])
+                continue
+            value = values.get(field.label)
+            if value:
+                value = (1 if value is True else value)
+            else:
+                value = None
+            row_data.append(value)
+        
+        # save data in a new line        
+        if replace_row is None:
+            if all(value is None for value in row_data):
+                # nothing to write, keep the first empty row
+                return None
+            rowid, following = self.rows.append()
+            self.data.append(row_data)
+            self.data.extend(following)
+            for row in following:
+                self.aggregates.add_row(row)
+        else:
+            rowid = replace_row
+            # cached rows may be shared, never modify them in place
+            self.data[index] = row_data
+        
+        # fill the row with values
+        for colid, value in enumerate(row_data, 1):
+            if colid in kept:
+                continue
+            elif value is not None:
+                try:
+                    datash[rowid, colid].set_value(value)
+                except IndexError:
+                    # add row
+                    datash.append_rows(1)
+                    datash[rowid, colid].set_value(value)
+                
+                # convert to boolean for cached data
+                if self.fields[colid-1].ident.startswith('check'):
+                    row_data[colid - 1] = bool(value)
+            elif replace_row is not None:
+                # emptied field or unchecked box: clear the old value
+                try:
+                    _clear_cell(datash[rowid, colid])
+                except IndexError:
+                    pass # no cell, nothing to clear
+        
+        if old_row is None:
+            self.aggregates.add_row(row_data)
+        else:
+            self.aggregates.replace_row(old_row, row_data)
+        return rowid
+
+    def get_values_from_data(self, row_id):
+        """Build the dict of {'name': value} for row_id from self.data"""
+        row = self.data[self.rows.data_index(row_id)]
+        vals = {}
+        for i, field in enumerate(self.fields):
+            vals[field.label] = row[i]
+        return vals
+
+    def iter_data(self, offset=0, limit=None):
+        """Iterate over the data rows, from the `offset`th one, at most
+            `limit` rows (all the following ones if None)
+            
+            Yield (row index, row data), where row index is the row id minus
+            HEADERS_ROW
+        """
+        stop = len(self.data)
+        if limit is not None:
+            stop = min(stop, offset + limit)
+        for index in range(offset, stop):
+            yield index, self.data[index]
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#       seafform/submissions.py
+#       
+#       Copyright © 2017, Flo Birée <flo@biree.name>
+#       
+#       This file is a part of seafform.
+#       
+#       This program is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU Affero General Public License as 
+#       published by the Free Software Foundation, either version 3 of the 
+#       License, or (at your option) any later version.
+#       
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU Affero General Public License for more details.
+#       
+#       You should have received a copy of the GNU Affero General Public License
+#       along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#       
+###############################################################################
+"""Seafform batched submissions
+
+Submissions to the same form are queued, and written by a single writer at a
+time: the first waiting request writes all the pending submissions of the
+form with one load, save and upload cycle, then the other requests get the
+row where their values were saved.
+"""
+
+__author__ = "Flo Birée"
+__version__ = "0.2"
+__license__ = "AGPLv3"
+__copyright__ = "Copyright © 2017, Flo Birée <flo@biree.name>"
+
+import threading
+
+class Submission:
+    """Values waiting to be posted into a form"""
+
+    def __init__(self, values, replace_row=None):
+        """New submission of `values`, optionaly replacing `replace_row`"""
+        self.values = values
+        self.replace_row = replace_row
+        self.rowid = None   # where values were saved
+        self.error = None   # exception raised while saving
+        self.done = threading.Event()
+
+    def __repr__(self):
+        return "<Submission({0})>".format(
+            'pending' if not self.done.is_set() else self.rowid
+        )
+
+class SubmissionQueue:
+    """Per-form queues of pending submissions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # form cache key: [Submission]
+        self._writers = {}  # form cache key: [writer lock, waiting requests]
+
+    def submit(self, seafform, values, replace_row=None):
+        """Post `values` into `seafform` (see SeafForm.post), together with
+            the other pending submissions of the same form
+
+            Return the row id where values were saved, raise the exception
+            which prevented to save them
+        """
+        key = seafform.cache_key
+        submission = Submission(values, replace_row)
+        with self._lock:
+            self._pending.setdefault(key, []).append(submission)
+            writer = self._writers.setdefault(key, [threading.Lock(), 0])
+            writer[1] += 1
+
+        try:
+            with writer[0]:
+                # if still pending, write it with all the others
+                writing = not submission.done.is_set()
+                if writing:
+                    with self._lock:
+                        batch = self._pending.pop(key, [])
+                    self._write(seafform, batch)
+        finally:
+            with self._lock:
+                writer[1] -= 1
+                if not writer[1]:
+                    # nobody is waiting for this form anymore
+                    del self._writers[key]
+
+        if submission.error is not None:
+            raise submission.error
+        if not writing:
+            # saved by another request, get up to date data
+            seafform.load()
+        return submission.rowid
+
+    def _write(self, seafform, batch):
+        """Post all the submissions of `batch` into `seafform`"""
+        try:
+            rowids = seafform.post_rows([
+                (submission.values, submission.replace_row)
+                for submission in batch
+            ])
+        except Exception as error:
+            for submission in batch:
+                submission.error = error
+        else:
+            for submission, result in zip(batch, rowids):
+                if isinstance(result, Exception):
+                    submission.error = result
+                else:
+                    submission.rowid = result
+        finally:
+            for submission in batch:
+                submission.done.set()
@@ -0,0 +1,519 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#       seafform/tests.py
+#       
+#       Copyright © 2015, Florian Birée <florian@biree.name>
+#       
+#       This file is a part of seafform.
+#       
+#       This program is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU Affero General Public License as 
+#       published by the Free Software Foundation, either version 3 of the 
+#       License, or (at your option) any later version.
+#       
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU Affero General Public License for more details.
+#       
+#       You should have received a copy of the GNU Affero General Public License
+#       along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#       
+###############################################################################
+
+__author__ = "Florian Birée"
+__version__ = "0.2"
+__license__ = "AGPLv3"
+__copyright__ = "Copyright © 2015, Florian Birée <florian@biree.name>"
+
+import os
+import glob
+import datetime
+import hashlib
+import shutil
+import tempfile
+import threading
+import ezodf
+from django.test import SimpleTestCase
+from django.utils import translation
+from seafform import odsreader
+from seafform.seafform import SeafForm, RowIndex, RowNotFound, field_classes
+from seafform.seafform import DateField, HEADERS_ROW, PROPERTIES_ROWS
+from seafform.aggregates import ColumnAggregates
+from seafform.cache import FormCache
+from seafform.forms import djform_class
+from seafform.submissions import SubmissionQueue
+from benchmarks.synthetic import generate_form, write_data_sheet
+from benchmarks.synthetic import iter_data_rows, properties
+
+FORMS_LIBRARY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', '..', '..', 'forms-library'
+)
+
+def _language_of(path):
+    """Return the language of the form `path`, from its file or directory
+        name (English by default)
+    """
+    return 'fr' if '_fr' in os.path.relpath(path, FORMS_LIBRARY) else 'en'
+
+def _strip(values):
+    """Return `values` without the trailing None"""
+    values = list(values)
+    while values and values[-1] is None:
+        values.pop()
+    return values
+
+def _cells(*values):
+    """Return table:table-cell elements, values are a string, a number, None,
+        or a (string or None, columns repeat count) tuple
+    """
+    cells = []
+    for value in values:
+        value, repeat = value if isinstance(value, tuple) else (value, 1)
+        attrs = (
+            ' table:number-columns-repeated="{0}"'.format(repeat)
+            if repeat > 1 else ''
+        )
+        if value is None:
+            cells.append('<table:table-cell{0}/>'.format(attrs))
+        elif isinstance(value, int):
+            cells.append(
+                '<table:table-cell{0} office:value-type="float" '
+                'office:value="{1}"><text:p>{1}</text:p>'
+                '</table:table-cell>'.format(attrs, value)
+            )
+        else:
+            cells.append(
+                '<table:table-cell{0} office:value-type="string">'
+                '<text:p>{1}</text:p></table:table-cell>'.format(attrs, value)
+            )
+    return ''.join(cells)
+
+def _row(*values, repeat=1):
+    """Return a table:table-row element, repeated `repeat` times"""
+    attrs = (
+        ' table:number-rows-repeated="{0}"'.format(repeat)
+        if repeat > 1 else ''
+    )
+    return '<table:table-row{0}>{1}</table:table-row>\n'.format(
+        attrs, _cells(*values)
+    )
+
+# Data sheet with repeated rows and columns on both sides of ezodf maxcount
+# (32), and a stray row after an empty row
+REPEATED_ROWS = [
+    _row('Field title', 'A', 'B', 'C', 'D'),
+    _row('Format', 'text', 'text', 'text', 'text'),
+    _row('Parameters'),
+    _row('Description', None, ('repeated', 3)),
+    _row(None, 'r31', ('c', 2), repeat=31),
+    _row(None, 'r32', None, 'd', repeat=32),
+    _row(None, 'r33', repeat=33),
+    _row(None, ('x', 31), 'after 31'),
+    _row(None, ('x', 32), 'after 32'),
+    _row(None, 'y', ('x', 33), 'after 33'),
+    _row(None, None, None, None, 'gap', repeat=3),
+    _row(repeat=2),
+    _row(None, None, 'stray'),
+    _row(None, None, ('stray', 32)),
+    _row(repeat=40),
+]
+
+class EzodfBaseline:
+    """A form Data sheet read with ezodf, like SeafForm did before the
+        streaming reader
+    """
+
+    def __init__(self, path):
+        datash = ezodf.opendoc(path).sheets['Data']
+        self.rows = [
+            _strip(cell.value for cell in datash.row(rowid))
+            for rowid in range(datash.nrows())
+        ]
+        self.nrows = datash.nrows()
+        self.ncols = datash.ncols()
+
+    def value(self, rowid, colid):
+        """Return the value of a cell, or None"""
+        values = self.rows[rowid] if rowid < self.nrows else []
+        return values[colid] if colid < len(values) else None
+
+    def first_empty_row(self):
+        """Return the first empty row: after the last value of column B,
+            then going down while cells are not empty, column by column
+        """
+        rowid = HEADERS_ROW
+        for candidate in range(HEADERS_ROW, self.nrows):
+            if self.value(candidate, 1):
+                rowid = candidate + 1
+        for colid in range(1, self.ncols):
+            while rowid < self.nrows and self.value(rowid, colid):
+                rowid += 1
+        return rowid
+
+class ODSReaderTest(SimpleTestCase):
+    """The streaming reader gives the same rows and forms than ezodf"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _forms(self):
+        """Return the paths of the forms to compare"""
+        paths = sorted(glob.glob(os.path.join(FORMS_LIBRARY, '*', '*.ods')))
+        for rows in (0, 10, 100):
+            paths.append(generate_form(
+                os.path.join(self.tmpdir, 'synthetic{0}.ods'.format(rows)),
+                rows, 12
+            ))
+        paths.append(write_data_sheet(
+            os.path.join(self.tmpdir, 'repeated.ods'), REPEATED_ROWS, 4
+        ))
+        return paths
+
+    def assertSameRows(self, path):
+        baseline = EzodfBaseline(path)
+        rows = list(odsreader.iter_rows(path, 'Data'))
+        self.assertEqual([rowid for rowid, values in rows],
+                         list(range(baseline.nrows)))
+        for rowid, values in rows:
+            self.assertEqual(values, baseline.rows[rowid],
+                             '{0} row {1}'.format(path, rowid))
+
+    def assertSameForm(self, path):
+        baseline = EzodfBaseline(path)
+        seafform = SeafForm(path)
+        seafform.load()
+        self.assertEqual(seafform.title,
+                         baseline.value(PROPERTIES_ROWS[0], 0))
+        self.assertEqual(
+            [(field.label, field.description, field.params)
+             for field in seafform.fields],
+            [(baseline.value(0, colid), baseline.value(3, colid),
+              baseline.value(2, colid))
+             for colid in range(1, baseline.ncols)
+             if baseline.value(1, colid) and
+                 baseline.value(1, colid).strip('*') in field_classes()],
+        )
+        first_empty_row = baseline.first_empty_row()
+        self.assertEqual(seafform.rows.first_empty_row, first_empty_row)
+        self.assertEqual(seafform.data, [
+            seafform._row_data(baseline.rows[rowid])
+            for rowid in range(HEADERS_ROW, first_empty_row)
+        ])
+        self.assertEqual(seafform.rows.stray_rows, {
+            rowid: seafform._row_data(baseline.rows[rowid])
+            for rowid in range(first_empty_row, baseline.nrows)
+            if any(baseline.rows[rowid][1:])
+        })
+        # streamed data rows, without loading the form
+        streamed = SeafForm(path)
+        self.assertEqual(list(streamed.iter_file_data()),
+                         list(enumerate(seafform.data)))
+        self.assertEqual(streamed.title, seafform.title)
+        self.assertEqual(
+            [(field.ident, field.label) for field in streamed.fields],
+            [(field.ident, field.label) for field in seafform.fields]
+        )
+
+    def test_rows(self):
+        for path in self._forms():
+            self.assertSameRows(path)
+
+    def test_load(self):
+        for path in self._forms():
+            # field types are written in the language of the form
+            with translation.override(_language_of(path)):
+                self.assertSameForm(path)
+
+    def test_repeated(self):
+        path = write_data_sheet(
+            os.path.join(self.tmpdir, 'repeated.ods'), REPEATED_ROWS, 4
+        )
+        seafform = SeafForm(path)
+        seafform.load()
+        # 31 rows, the rows repeated 32 and 33 times counted once, then
+        # the 3 rows following them (column D goes down to the gap rows)
+        self.assertEqual(len(seafform.data), 31 + 1 + 1 + 3 + 3)
+        # cells repeated 32 times or more are counted once
+        self.assertEqual(seafform.data[33], ['x', 'x', 'x', 'x'])
+        self.assertEqual(seafform.data[34], ['x', 'after 32', None, None])
+        self.assertEqual(seafform.data[35], ['y', 'x', 'after 33', None])
+        self.assertEqual(seafform.data[-1], [None, None, None, 'gap'])
+        self.assertEqual(list(seafform.rows.stray_rows.values()),
+                         [[None, 'stray', None, None],
+                          [None, 'stray', None, None]])
+
+    def test_missing_sheet(self):
+        path = write_data_sheet(
+            os.path.join(self.tmpdir, 'form.ods'), REPEATED_ROWS, 4
+        )
+        with self.assertRaises(odsreader.SheetNotFound):
+            list(odsreader.iter_rows(path, 'Missing'))
+
+class LocalSeafile:
+    """Seafile connector stub, with the files of a local directory"""
+
+    def __init__(self, root):
+        self.root = root
+        self.after_update = None # called once after the next update
+
+    def _file_id(self, data):
+        return hashlib.sha1(data).hexdigest()
+
+    def stat_file(self, repo_id, path):
+        with open(os.path.join(self.root, path), 'rb') as fileo:
+            fid = self._file_id(fileo.read())
+        return {
+            'id': fid,
+            'mtime': int(os.path.getmtime(os.path.join(self.root, path))),
+        }
+
+    def open_file(self, repo_id, path):
+        return open(os.path.join(self.root, path), 'rb')
+
+    def update_file(self, repo_id, path, fileo):
+        data = fileo.read()
+        with open(os.path.join(self.root, path), 'wb') as target:
+            target.write(data)
+        after_update, self.after_update = self.after_update, None
+        if after_update is not None:
+            after_update()
+        return self._file_id(data)
+
+class RowTrackingTest(SimpleTestCase):
+    """Posted rows keep the data, row index and aggregates in sync with the
+        file
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        # static, text, number and check fields; 3 data rows, 2 rows with
+        # only properties, then stray rows without the static column
+        props = properties('Rows', 'Row tracking', 'table', True, False)
+        rows = list(iter_data_rows(3, 4, props))
+        for rowid in range(9, 16):
+            stray = _row(props.get(rowid), None, 'Stray {0}'.format(rowid),
+                         rowid, 1 if rowid % 2 else None)
+            rows[rowid:rowid + 1] = [stray]
+        self.path = write_data_sheet(
+            os.path.join(self.tmpdir, 'form.ods'), rows, 4
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _values(self, text, number, check):
+        return {'Field 2': text, 'Field 3': number, 'Field 4': check}
+
+    def assertInSync(self, seafform):
+        """Aggregates match the data, data and index match the file"""
+        aggregates = ColumnAggregates(seafform.fields, seafform.data)
+        self.assertEqual(seafform.aggregates.count, aggregates.count)
+        self.assertEqual(seafform.aggregates.sum, aggregates.sum)
+        self.assertEqual(seafform.aggregates.checked, aggregates.checked)
+        reloaded = SeafForm(self.path)
+        reloaded.load()
+        self.assertEqual(seafform.data, reloaded.data)
+        self.assertEqual(seafform.rows.first_empty_row,
+                         reloaded.rows.first_empty_row)
+        self.assertEqual(seafform.rows.stray_rows, reloaded.rows.stray_rows)
+        self.assertEqual(seafform.aggregates.computations(),
+                         reloaded.aggregates.computations())
+
+    def test_row_index(self):
+        rows = RowIndex(7, {9: ['a'], 10: ['b'], 12: ['c']})
+        self.assertEqual(len(rows), 7 - HEADERS_ROW)
+        self.assertEqual(rows.append(), (7, []))
+        self.assertEqual(rows.append(), (8, [['a'], ['b']]))
+        self.assertEqual(rows.first_empty_row, 11)
+        self.assertEqual(rows.stray_rows, {12: ['c']})
+        self.assertIn(10, rows)
+        self.assertNotIn(12, rows)
+        with self.assertRaises(KeyError):
+            rows.data_index(12)
+
+    def test_append(self):
+        seafform = SeafForm(self.path)
+        seafform.load()
+        self.assertEqual(len(seafform.data), 3)
+        self.assertEqual(sorted(seafform.rows.stray_rows), list(range(9, 16)))
+        self.assertEqual(seafform.post(self._values('new', 42, True)), 7)
+        self.assertEqual(len(seafform.data), 4)
+        self.assertInSync(seafform)
+        # the next row reaches the stray rows
+        self.assertEqual(seafform.post(self._values('next', 1, None)), 8)
+        self.assertEqual(len(seafform.data), 12)
+        self.assertEqual(seafform.rows.stray_rows, {})
+        self.assertInSync(seafform)
+
+    def test_append_empty(self):
+        cache = FormCache()
+        seafform = SeafForm(self.path, cache=cache)
+        seafform.load()
+        # nothing to write: no row is used
+        self.assertIsNone(seafform.post(self._values(None, None, None)))
+        self.assertEqual(seafform.rows.first_empty_row, 7)
+        values = dict(self._values('new', 3, None), **{'Field 1': 'Item'})
+        self.assertEqual(seafform.post(values), 7)
+        self.assertInSync(seafform)
+        cached = SeafForm(self.path, cache=cache)
+        cached.load()
+        self.assertInSync(cached)
+        self.assertEqual(cached.data[-1], ['Item', 'new', 3, None])
+        # without value in column B, the form is read again from the file
+        seafform.post(self._values('next', 1, None))
+        self.assertIsNone(
+            cache.get(seafform.cache_key, seafform._get_version())
+        )
+        cached = SeafForm(self.path, cache=cache)
+        cached.load()
+        self.assertInSync(cached)
+
+    def test_changed_while_opening(self):
+        seafform = SeafForm(self.path)
+        seafform.load()
+        other = SeafForm(self.path)
+        other.load()
+        open_odsfile = seafform._open_odsfile
+        def open_changed():
+            # another writer saves a row between the version check and the
+            # opening of the document
+            other.post(dict(self._values('other', 1, None), **{
+                'Field 1': 'Other'
+            }))
+            seafform._open_odsfile = open_odsfile
+            open_odsfile()
+        seafform._open_odsfile = open_changed
+        values = dict(self._values('mine', 2, None), **{'Field 1': 'Mine'})
+        self.assertEqual(seafform.post(values), 8)
+        self.assertEqual([row[0] for row in seafform.data[3:5]],
+                         ['Other', 'Mine'])
+        self.assertInSync(seafform)
+
+    def test_saved_over(self):
+        cache = FormCache()
+        seaf = LocalSeafile(self.tmpdir)
+        seafform = SeafForm('form.ods', seaf, 'repo', cache=cache)
+        seafform.load()
+        def post_other():
+            # another writer saves the file just after this one
+            other = SeafForm('form.ods', seaf, 'repo')
+            other.load()
+            other.post(dict(self._values('other', 1, None), **{
+                'Field 1': 'Other'
+            }))
+        seaf.after_update = post_other
+        seafform.post(dict(self._values('mine', 2, None), **{
+            'Field 1': 'Mine'
+        }))
+        # not cached as the version saved by the other writer
+        self.assertIsNone(
+            cache.get(seafform.cache_key, seafform._get_version())
+        )
+        cached = SeafForm('form.ods', seaf, 'repo', cache=cache)
+        cached.load()
+        self.assertEqual([row[0] for row in cached.data[3:5]],
+                         ['Mine', 'Other'])
+        self.assertInSync(cached)
+
+    def test_replace(self):
+        seafform = SeafForm(self.path)
+        seafform.load()
+        # row 6 has a checked box: uncheck it, empty the text
+        self.assertTrue(seafform.data[6 - HEADERS_ROW][3])
+        seafform.post(self._values(None, 7, False), 6)
+        self.assertEqual(seafform.data[6 - HEADERS_ROW][1:], [None, 7, None])
+        self.assertInSync(seafform)
+        # replace a stray row become a data row
+        seafform.post(self._values('new', None, None))
+        seafform.post(self._values('next', 3, None))
+        seafform.post(self._values('stray', 8, True), 12)
+        self.assertInSync(seafform)
+
+    def test_post_rows(self):
+        seafform = SeafForm(self.path)
+        seafform.load()
+        results = seafform.post_rows([
+            (self._values('new', 5, True), None),
+            (self._values('stray', 6, None), 12),
+            (self._values('next', 7, None), None),
+            (self._values('replaced', None, True), 4),
+        ])
+        self.assertEqual(results[0], 7)
+        self.assertIsInstance(results[1], RowNotFound)
+        self.assertEqual(results[2:], [8, 4])
+        self.assertInSync(seafform)
+        with self.assertRaises(RowNotFound):
+            seafform.post(self._values('stray', 6, None), 20)
+
+class SubmissionQueueTest(SimpleTestCase):
+    """Concurrent submissions to a form are all saved"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = generate_form(
+            os.path.join(self.tmpdir, 'form.ods'), 3, 4
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_concurrent(self):
+        queue = SubmissionQueue()
+        cache = FormCache()
+        start = threading.Barrier(20)
+        rowids = {}
+        errors = {}
+        def submit(number):
+            seafform = SeafForm(self.path, cache=cache)
+            seafform.load()
+            values = {
+                'Field 1': 'Item', 'Field 2': 'Answer {0}'.format(number)
+            }
+            # the 8th submission replaces a row which is not a data row
+            replace_row = 99 if number == 7 else None
+            start.wait()
+            try:
+                rowids[number] = queue.submit(seafform, values, replace_row)
+            except Exception as error:
+                errors[number] = error
+        threads = [
+            threading.Thread(target=submit, args=(number,))
+            for number in range(20)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(list(errors), [7])
+        self.assertIsInstance(errors[7], RowNotFound)
+        self.assertEqual(len(set(rowids.values())), 19)
+        seafform = SeafForm(self.path)
+        seafform.load()
+        self.assertEqual(len(seafform.data), 3 + 19)
+        for number, rowid in rowids.items():
+            self.assertEqual(seafform.data[rowid - HEADERS_ROW][1],
+                             'Answer {0}'.format(number))
+        self.assertEqual(queue._writers, {})
+        self.assertEqual(queue._pending, {})
+
+class DjFormTest(SimpleTestCase):
+    """Django forms built from form fields"""
+
+    def test_date_years(self):
+        djform_cls = djform_class([DateField('Years test')])
+        # class built years ago, then cached
+        djform_cls.base_fields['Years test'].widget.years = range(2000, 2010)
+        djform = djform_cls()
+        this_year = datetime.date.today().year
+        self.assertEqual(list(djform.fields['Years test'].widget.years),
+                         list(range(this_year, this_year + 10)))
+        self.assertEqual(
+            list(djform_cls.base_fields['Years test'].widget.years),
+            list(range(2000, 2010))
+        )
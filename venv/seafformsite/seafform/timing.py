@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#       seafform/timing.py
+#       
+#       Copyright © 2017, Flo Birée <flo@biree.name>
+#       
+#       This file is a part of seafform.
+#       
+#       This program is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU Affero General Public License as 
+#       published by the Free Software Foundation, either version 3 of the 
+#       License, or (at your option) any later version.
+#       
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU Affero General Public License for more details.
+#       
+#       You should have received a copy of the GNU Affero General Public License
+#       along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#       
+###############################################################################
+"""Seafform stage timings
+
+Measure the time spent by a request in each of its stages, which don't
+overlap:
+    seafile     Seafile API requests (and file download headers)
+    download    copy of the downloaded ODS file
+    load        parsing of the Data sheet
+    opendoc     opening of the ODS file by ezodf, to modify it
+    saveas      saving of the modified ODS file by ezodf
+    upload      upload of the saved ODS file to Seafile
+    render      template rendering
+
+Stages are only measured while timings are collected for the current thread,
+by TimingMiddleware (if settings.STAGE_TIMING is True) or by collect().
+"""
+
+__author__ = "Flo Birée"
+__version__ = "0.2"
+__license__ = "AGPLv3"
+__copyright__ = "Copyright © 2017, Flo Birée <flo@biree.name>"
+
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+# timings collected by the current thread
+_local = threading.local()
+
+class Timings:
+    """Durations of the stages of a request"""
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.stages = OrderedDict() # name: [count, total duration]
+
+    def __repr__(self):
+        return "<Timings({0})>".format(self)
+
+    def __str__(self):
+        return ' '.join(
+            ['total={0:.1f}ms'.format(self.total * 1000)] +
+            [
+                '{0}={1:.1f}ms({2})'.format(name, duration * 1000, count)
+                for name, (count, duration) in self.stages.items()
+            ]
+        )
+
+    @property
+    def total(self):
+        """Time elapsed since the beginning of the collect"""
+        return perf_counter() - self.start
+
+    def add(self, name, duration):
+        """Add `duration` seconds to the stage `name`"""
+        entry = self.stages.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += duration
+
+    def server_timing(self):
+        """Return the value of a Server-Timing header for these timings"""
+        return ', '.join(
+            ['total;dur={0:.1f}'.format(self.total * 1000)] +
+            [
+                '{0};dur={1:.1f};desc="{2}x"'.format(
+                    name, duration * 1000, count
+                )
+                for name, (count, duration) in self.stages.items()
+            ]
+        )
+
+def current():
+    """Return the Timings collected by the current thread, or None"""
+    return getattr(_local, 'timings', None)
+
+@contextmanager
+def collect():
+    """Collect the stage timings of the current thread, yield the Timings"""
+    previous = current()
+    timings = _local.timings = Timings()
+    try:
+        yield timings
+    finally:
+        _local.timings = previous
+
+@contextmanager
+def stage(name):
+    """Measure the duration of the stage `name`, if timings are collected"""
+    timings = current()
+    if timings is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, perf_counter() - start)
+
+class TimingMiddleware:
+    """Log the stage timings of each request, with the 'seafform.timing'
+        logger, and send them in a Server-Timing header if
+        settings.STAGE_TIMING_HEADER is True
+
+        Only used if settings.STAGE_TIMING is True.
+    """
+
+    def __init__(self):
+        # not imported at module level: seafform can be used without Django
+        from django.conf import settings
+        from django.core.exceptions import MiddlewareNotUsed
+        if not getattr(settings, 'STAGE_TIMING', False):
+            raise MiddlewareNotUsed
+        self.header = getattr(settings, 'STAGE_TIMING_HEADER', False)
+
+    def process_request(self, request):
+        _local.timings = Timings()
+
+    def process_response(self, request, response):
+        timings, _local.timings = current(), None
+        if timings is None:
+            # process_request not called
+            return response
+        logger.info('%s %s %s', request.method, request.path, timings)
+        if self.header:
+            response['Server-Timing'] = timings.server_timing()
+        return response
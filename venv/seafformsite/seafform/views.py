@@ -0,0 +1,613 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#       seafform/views.py
+#       
+#       Copyright © 2015, Florian Birée <florian@biree.name>
+#       
+#       This file is a part of seafform.
+#       
+#       This program is free software: you can redistribute it and/or modify
+#       it under the terms of the GNU Affero General Public License as 
+#       published by the Free Software Foundation, either version 3 of the 
+#       License, or (at your option) any later version.
+#       
+#       This program is distributed in the hope that it will be useful,
+#       but WITHOUT ANY WARRANTY; without even the implied warranty of
+#       MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#       GNU Affero General Public License for more details.
+#       
+#       You should have received a copy of the GNU Affero General Public License
+#       along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#       
+###############################################################################
+"""Seafform views"""
+
+__author__ = "Florian Birée"
+__version__ = "0.2"
+__license__ = "AGPLv3"
+__copyright__ = "Copyright © 2015, Florian Birée <florian@biree.name>"
+
+import os
+import csv
+import json
+from urllib.parse import quote, unquote
+import itertools
+from django.utils.text import slugify
+from django.core.urlresolvers import reverse
+from django.contrib.auth.models import User
+from django.http import HttpResponseRedirect, Http404, JsonResponse
+from django.http import StreamingHttpResponse
+from django.shortcuts import render
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth import authenticate, login, logout
+from django.views.decorators.csrf import csrf_exempt
+from django.utils import timezone
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from seafform.models import SeafileUser, Form
+from seafform.forms import LoginForm, djform_class
+from seafform.seafile import Seafile, AuthError, APIError, get_connector
+from seafform.seafform import SeafForm, RowNotFound, HEADERS_ROW
+from seafform.cache import FormCache, ListingCache
+from seafform.submissions import SubmissionQueue
+from seafform.timing import stage
+from django.conf import settings
+
+# parsed forms, shared by all requests of this process
+form_cache = FormCache(
+    maxsize=getattr(settings, 'FORM_CACHE_SIZE', 64),
+    backend=(
+        caches[settings.FORM_CACHE_BACKEND]
+        if getattr(settings, 'FORM_CACHE_BACKEND', None) else None
+    ),
+    timeout=getattr(settings, 'FORM_CACHE_TIMEOUT', None),
+)
+# pending submissions, written in batches by a single writer per form
+submission_queue = SubmissionQueue()
+# libraries and directories listings, for the file browser
+listing_cache = ListingCache(ttl=getattr(settings, 'LISTING_CACHE_TTL', 30))
+# rows displayed by default in each table page, and maximum requested rows
+TABLE_PAGE_SIZE = getattr(settings, 'TABLE_PAGE_SIZE', 100)
+TABLE_MAX_PAGE_SIZE = getattr(settings, 'TABLE_MAX_PAGE_SIZE', 1000)
+
+def _seafile_of(user):
+    """Return the authenticated Seafile connector of `user`"""
+    seafu = user.seafileuser
+    return get_connector(
+        seafu.seafroot,
+        user.email,
+        seafu.seaftoken,
+        verifycerts=settings.VERIFYCERTS,
+        timeout=getattr(settings, 'SEAFILE_TIMEOUT', None),
+    )
+
+def _log(request, email, password, nextview):
+    """ Authenticate or create a new account """
+    seaf_root = settings.SEAFILE_ROOT
+    user = authenticate(username=email, password=password)
+    # if known user:
+    if user is not None and user.is_active:
+        login(request, user)
+        # login, -> nexturl
+        return HttpResponseRedirect(reverse(nextview))
+    elif user is not None: # not active
+        raise AuthError
+    else:
+        # try to connect to seafile using credentials
+        seaf = Seafile(seaf_root, verifycerts=settings.VERIFYCERTS)
+        seaf.authenticate(email, password) # may raise AuthError
+        token = seaf.token
+        # create new user, save the token
+        user = User.objects.create_user(email, email, password)
+        user.save()
+        seafuser = SeafileUser(user=user, seafroot=seaf_root,
+                                seaftoken=token)
+        seafuser.save()
+        # login
+        user2 = authenticate(username=email, password=password)
+        login(request, user2)
+        # -> nextview
+        return HttpResponseRedirect(reverse(nextview))
+
+def index(request):
+    """Main login view"""
+    #TODO: whatif the seafile password change?
+        # the user should with it's old password, and should be able to
+        # enter its new password and resync
+    justlogout = False
+    autherror = False
+       
+    # if authenticated, redirect to /private and no public forms
+    if not settings.ALLOW_PUBLIC and request.user.is_authenticated():
+        return HttpResponseRedirect(reverse('private'))
+    
+    # if this is a POST request we need to process the form data
+    if request.method == 'POST':
+        # create a form instance and populate it with data from the request:
+        form = LoginForm(request.POST)
+        # check whether it's valid:
+        if form.is_valid():
+            
+            email = form.cleaned_data['email']
+            password = form.cleaned_data['password']
+            
+            nextstep = (
+                'index'
+                if (settings.ALLOW_PUBLIC and settings.PUBLIC_NEED_AUTH) 
+                else 'private'
+            )
+            
+            try:
+                return _log(request, email, password, nextstep)
+            except AuthError:
+                autherror = True
+
+    # if a GET (or any other method) we'll create a blank form
+    else:
+        form = LoginForm()
+    
+    if 'action' in request.GET:
+        justlogout = (request.GET['action'] == 'logout')
+
+    return render(request, 'seafform/index.html', {
+        'loginform': form,
+        'autherror': autherror,
+        'justlogout': justlogout,
+        'seaf_root': settings.SEAFILE_ROOT,
+        'allow_public': settings.ALLOW_PUBLIC,
+        'public_needauth': settings.PUBLIC_NEED_AUTH,
+        'authenticated': request.user.is_authenticated(),
+        'public_forms': Form.objects.filter(public=True).\
+                              order_by('-creation_datetime'),
+        'show_public': (
+            settings.ALLOW_PUBLIC and ( 
+                request.user.is_authenticated()
+                or 
+                not settings.PUBLIC_NEED_AUTH
+            )),
+    })
+
+@login_required(login_url='index')
+def private(request):
+    """Home of private pages"""
+    newform = None
+    delformtitle = None
+    deleted = None
+    if request.method == 'POST': #delete
+        deleteid = request.POST.get('deleteid', '')
+        try:
+            tobedeleted = Form.objects.get(formid=deleteid, owner=request.user)
+        except Form.DoesNotExist:
+            # do nothing
+            pass
+        else:
+            # delete, redirect plus message
+            deleted = tobedeleted.title
+            tobedeleted.delete()
+    
+    if 'newform' in request.GET:
+        try:
+            newform = Form.objects.get(formid=request.GET['newform'], 
+                                        owner=request.user)
+        except Form.DoesNotExist:
+            pass
+        
+    return render(request, 'seafform/private.html', {
+        'user': request.user,
+        'forms': None,
+        'tplurl': settings.TPL_URL,
+        'forms': Form.objects.filter(owner=request.user).\
+                              order_by('-creation_datetime'),
+        'newform': newform,
+        'deleted': deleted,
+        'allow_public': settings.ALLOW_PUBLIC,
+    })
+
+def logout_view(request):
+    """Just… log out"""
+    logout(request)
+    # Redirect to a success page.
+    return HttpResponseRedirect(reverse('index') + '?action=logout')
+
+@login_required(login_url='index')
+def new(request):
+    """Create a new form"""
+    # if this is a POST request we need to process the form data
+    if request.method == 'POST':
+        path = unquote(request.POST.get('path', ''))
+        #print('new/path=' + path)
+        if path.endswith('.ods'):
+            if settings.LOCAL:
+                filepath = os.path.join(settings.LOCAL_ROOT, path.lstrip('/'))
+                seaf = None
+                repoid = 'LOCAL'
+                reponame = 'LOCAL'
+            else:
+                # Connect to Seafile
+                seaf = _seafile_of(request.user)
+                # retreive path info
+                parsed_path = parse(path)
+                filepath = parsed_path['path']
+                repoid = repo_id_from_name(seaf, parsed_path['repo_name'])
+                reponame = parsed_path['repo_name']
+            # load the form
+            seafform = SeafForm(filepath, seaf, repoid, cache=form_cache)
+            seafform.load()
+            # create the slug/formid
+            max_length = Form._meta.get_field('formid').max_length
+            formid = orig = slugify(seafform.title)[:max_length]
+            
+            for x in itertools.count(1):
+                if not Form.objects.filter(formid=formid).exists():
+                    break
+            # Truncate the original slug dynamically. Minus 1 for the hyphen.
+            formid = "%s-%d" % (orig[:max_length - len(str(x)) - 1], x)
+            
+            # add the new form
+            newform = Form(
+                owner = request.user,
+                filepath = filepath,
+                repoid = repoid,
+                reponame = reponame,
+                formid = formid,
+                title = seafform.title,
+                creation_datetime = timezone.now(),
+                description = seafform.description,
+                public = seafform.public,
+            )
+            newform.save()
+            # Redirect + message
+            return HttpResponseRedirect(reverse('private') + '?newform=' + formid)
+    
+    elif not settings.LOCAL:
+        # new file browser, show up to date libraries and directories
+        listing_cache.invalidate(_seafile_of(request.user))
+    
+    return render(request, 'seafform/new.html', {
+        'user': request.user,
+        'allow_public': settings.ALLOW_PUBLIC,
+    })
+
+# utility function
+def parse(seafpath):
+    """Return a seafile path under the form :
+            {
+                'repo_name':
+                'path'
+            }
+        the root of all libraries has repo_id == None 
+    """
+    seafpath = seafpath.strip('/').split('/')
+    if seafpath == ['']:
+        # root
+        return {'repo_name': None, 'repo_id': None, 'path': None}
+    else:
+        return {
+            'repo_name': seafpath[0],
+            'path': '/' + '/'.join(seafpath[1:])
+        }
+
+def repo_id_from_name(seaf, repo_name):
+    """Return the repo_id from a repo_name"""
+    return listing_cache.repo_id(seaf, repo_name)
+
+@csrf_exempt # the javascript lib user POST, but no data changes here
+@login_required(login_url='index')
+def lsdir(request):
+    """Return the list of files in a Seafile directory"""
+    if request.method == 'POST':
+        # dirty hack
+        path = unquote(unquote(request.POST['dir'], encoding='latin9'))
+        if settings.LOCAL:
+            local_root = settings.LOCAL_ROOT.rstrip('/')
+            abspath = local_root +  path
+            result = []
+            for entry in os.scandir(abspath):
+                is_dir = entry.is_dir()
+                if is_dir or entry.name.endswith('.ods'):
+                    result.append({
+                        'name': entry.name,
+                        'type': ('dir' if is_dir else 'file'),
+                        'path': (
+                            entry.path[len(local_root):] +
+                            ('/' if is_dir else '')
+                        )
+                    })
+        else:
+            # Connect to Seafile
+            seaf = _seafile_of(request.user)
+            # list the directory
+            parsed_path = parse(path)
+            # root of all libraries
+            if parsed_path['repo_name'] is None:
+                repo_list = listing_cache.repos(seaf)[0]
+                result = [
+                    {
+                        'name': repo['name'],
+                        'type': repo['type'],
+                        'path': quote('/%s/' % repo['name']),
+                   } for repo in repo_list 
+                ]
+            else:
+                repo_name, dirpath = parsed_path['repo_name'], parsed_path['path']
+                repo_id = repo_id_from_name(seaf, repo_name)
+                ls = listing_cache.list_dir(seaf, repo_id, dirpath)
+                result = [
+                    {
+                        'name': node['name'],
+                        'type': node['type'],
+                        'path': quote( (
+                            path.rstrip('/') + '/' + node['name'] + 
+                            ('/' if node['type'] == 'dir' else '') )
+                        )
+                    } for node in ls
+                    if (node['type'] == 'dir' or node['name'].endswith('.ods'))
+                ]
+        with stage('render'):
+            return render(request, 'seafform/lsdir.html', {'result': result})
+    raise Http404("Bad request method")
+
+def _update_form_attr(dbform, seafform):
+    """Update db attributes from ODS file"""
+    needupdate = False
+    if seafform.title != dbform.title:
+        dbform.title = seafform.title
+        needupdate = True
+    if seafform.public != dbform.public:
+        dbform.public = seafform.public
+        needupdate = True
+    if needupdate:
+        dbform.save()
+
+def _seafform_of(form):
+    """Return the SeafForm of the Form `form`, not loaded"""
+    # get the seafform object (Seafile connexion)
+    if settings.LOCAL:
+        seaf = None
+    else:
+        seaf = _seafile_of(form.owner)
+    return SeafForm(form.filepath, seaf, form.repoid, cache=form_cache)
+
+def _load_seafform(form):
+    """Return the loaded SeafForm of the Form `form`"""
+    seafform = _seafform_of(form)
+    try:
+        seafform.load()
+    except APIError:
+        raise Http404
+    return seafform
+
+def _data_readable(seafform):
+    """True if the data of `seafform` can be read by its users"""
+    return seafform.view_as == 'table' or seafform.edit
+
+def _int_param(request, name, default):
+    """Return the integer `name` query parameter, or `default`"""
+    try:
+        return int(request.GET.get(name, default))
+    except ValueError:
+        return default
+
+def _page_of(request, count, around=None):
+    """Return the (offset, limit) of the requested page of `count` rows, or
+        of the page including the row `around` if no offset is requested
+    """
+    limit = _int_param(request, 'limit', TABLE_PAGE_SIZE)
+    limit = max(1, min(limit, TABLE_MAX_PAGE_SIZE))
+    if around is not None and 'offset' not in request.GET:
+        offset = around - around % limit
+    else:
+        offset = _int_param(request, 'offset', 0)
+        offset = max(0, min(offset, count - 1))
+    return offset, limit
+
+class _Echo:
+    """Pseudo file which returns written values, for csv.writer"""
+    
+    def write(self, value):
+        return value
+
+def _csv_lines(seafform, rows):
+    """Yield the lines of the CSV export of seafform `rows`, as given by
+        SeafForm.iter_data()
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow([field.label for field in seafform.fields])
+    for index, row in rows:
+        yield writer.writerow(row)
+
+def _json_lines(seafform, rows):
+    """Yield the lines of the JSON export of seafform `rows`, as given by
+        SeafForm.iter_data()
+    """
+    yield '{"fields": %s, "rows": [' % json.dumps(
+        [field.label for field in seafform.fields]
+    )
+    for index, row in rows:
+        yield ('\n' if index == 0 else ',\n') + json.dumps(
+            row, cls=DjangoJSONEncoder
+        )
+    yield '\n]}\n'
+
+def formview(request, formid):
+    """Display a public form"""
+    justaddedrow = None
+    # get the form object
+    try:
+        form = Form.objects.get(formid=formid)
+    except Form.DoesNotExist:
+        raise Http404
+    seafform = _load_seafform(form)
+    
+    _update_form_attr(form, seafform)
+    
+    # build the corresponding DjForm()
+    DjForm = djform_class(seafform.fields)
+    if request.method == 'POST':
+        results = False
+        # results management
+        djform = DjForm(request.POST)
+        if djform.is_valid():
+            # check if we replace a row
+            if seafform.edit and djform.cleaned_data['rowid'] != 'newrow':
+                replace_row = int(djform.cleaned_data['rowid'])
+                if replace_row not in seafform.rows:
+                    raise Http404
+            else:
+                replace_row = None
+            # save data, with other pending submissions to this form
+            try:
+                rowid = submission_queue.submit(
+                    seafform, djform.cleaned_data, replace_row
+                )
+            except RowNotFound:
+                # the row was removed from the file meanwhile
+                raise Http404
+            if rowid is not None:
+                justaddedrow = rowid - HEADERS_ROW
+            
+            # if valid form and form and not edit:
+            if seafform.view_as == 'form' and not seafform.edit:
+                # redirect to thanks
+                return HttpResponseRedirect(reverse('thanks',args=(formid,)))
+            elif seafform.view_as == 'form':
+                return HttpResponseRedirect(
+                    reverse('form',args=(formid,)) + '?results'
+                )
+                #results = True # redirect to table
+                
+            # clean fields
+            djform = DjForm()
+    else:
+        djform = DjForm()
+        results = ('results' in request.GET)
+        
+    if seafform.view_as == 'form' and not results:
+        # form view
+        with stage('render'):
+            return render(request, 'seafform/form_as_form.html', {
+                'seafform': seafform,
+                'modelform': form,
+                'djform': djform,
+            })
+        
+    elif seafform.view_as == 'table' or (results and seafform.edit):
+        # hightlight first column if static field
+        first_is_static = (seafform.fields[0].ident == 'static')
+        # results, maintained by the form while loading and posting
+        computations = seafform.aggregates.computations()
+        # columns with a star
+        max_chk_column = seafform.aggregates.max_checked_columns()
+        # rows of the current page
+        count = len(seafform.data)
+        offset, limit = _page_of(request, count, justaddedrow)
+        def page_url(page_offset):
+            query = request.GET.copy()
+            query['offset'] = page_offset
+            query['limit'] = limit
+            return '?' + query.urlencode()
+        page = {
+            'count': count,
+            'first': offset + 1,
+            'last': min(offset + limit, count),
+            'previous': page_url(max(0, offset - limit)) if offset else None,
+            'next': page_url(offset + limit) if offset + limit < count else None,
+        }
+        
+        # table view    
+        with stage('render'):
+            return render(request, 'seafform/form_as_table.html', {
+                'seafform': seafform,
+                'modelform': form,
+                'djform': djform,
+                'justaddedrow': justaddedrow,
+                'rows': seafform.iter_data(offset, limit),
+                'page': page,
+                'first_is_static': first_is_static,
+                'computations': computations,
+                'max_chk_column': max_chk_column,
+            })
+
+    raise Http404
+
+def formrowedit(request, formid, rowid):
+    """Generate a form to edit rowid in formid"""
+    rowid = int(rowid) + HEADERS_ROW
+    # get the form object
+    try:
+        form = Form.objects.get(formid=formid)
+    except Form.DoesNotExist:
+        raise Http404
+    seafform = _load_seafform(form)
+    # create the django form for a specific row
+    try:
+        initials = seafform.get_values_from_data(rowid)
+    except KeyError:
+        raise Http404
+    initials['rowid'] = rowid
+    djform = djform_class(seafform.fields)(initials)
+    with stage('render'):
+        return render(request, 'seafform/rowedit.html', {
+            'seafform': seafform,
+            'djform': djform,
+            'modelform': form,
+            'rowid': rowid - HEADERS_ROW,
+        })
+
+def formrows(request, formid):
+    """Return a page of rows of formid, as JSON"""
+    # get the form object
+    try:
+        form = Form.objects.get(formid=formid)
+    except Form.DoesNotExist:
+        raise Http404
+    seafform = _load_seafform(form)
+    if not _data_readable(seafform):
+        raise Http404
+    offset, limit = _page_of(request, len(seafform.data))
+    return JsonResponse({
+        'fields': [field.label for field in seafform.fields],
+        'count': len(seafform.data),
+        'offset': offset,
+        'rows': [row for index, row in seafform.iter_data(offset, limit)],
+    })
+
+def formexport(request, formid, fmt):
+    """Export all the rows of formid, as CSV or JSON"""
+    # get the form object
+    try:
+        form = Form.objects.get(formid=formid)
+    except Form.DoesNotExist:
+        raise Http404
+    seafform = _seafform_of(form)
+    try:
+        # read from the file while streaming if the form is not cached
+        rows = seafform.iter_file_data()
+    except APIError:
+        raise Http404
+    if not _data_readable(seafform):
+        raise Http404
+    # stream rows, without building the whole file
+    if fmt == 'csv':
+        lines = _csv_lines(seafform, rows)
+        content_type = 'text/csv; charset=utf-8'
+    else:
+        lines = _json_lines(seafform, rows)
+        content_type = 'application/json'
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (
+        slugify(seafform.title or '') or formid, fmt
+    )
+    return response
+
+def thanks(request, formid):
+    """Display the Thanks page"""
+    # get the form object
+    try:
+        form = Form.objects.get(formid=formid)
+    except Form.DoesNotExist:
+        raise Http404
+    return render(request, 'seafform/thanks.html', {
+        'seafform': form,
+    })
+